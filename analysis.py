@@ -0,0 +1,172 @@
+"""
+background analysis for interactive front ends
+
+An AnalysisWorker owns a separate process that searches the positions it
+is given, so a front end such as the GUI never blocks on a search. Each
+new position replaces the one being analyzed: the running search sees
+that its job is no longer the latest one and stops, and positions queued
+in the meantime are skipped. Updates after every completed iteration are
+put on a queue that the front end reads without blocking with ``poll``,
+for instance from a Tk ``after`` callback.
+"""
+
+import multiprocessing
+import queue
+from collections import namedtuple
+from bitboard import move2uci
+from board import Board
+from san import move2san
+from search import MATE, MAX_PLY, Searcher
+from transposition import TranspositionTable
+
+# job : number of the position, as returned by AnalysisWorker.analyze
+# depth : depth of the completed iteration
+# score : score in centipawns from the point of view of white
+# pv : principal variation in SAN
+# moves : principal variation in long algebraic notation
+# nodes : nodes searched so far
+# done : whether the search of the position is over
+AnalysisUpdate = namedtuple(
+    "AnalysisUpdate", ["job", "depth", "score", "pv", "moves", "nodes", "done"]
+)
+
+
+def format_score(score):
+    """ score from white in pawns, e.g. "+0.35", or "#3" / "#-2" for mates """
+    if abs(score) >= MATE - MAX_PLY:
+        moves = (MATE - abs(score) + 1) // 2
+        return f"#{moves}" if score > 0 else f"#-{moves}"
+    return f"{score / 100:+.2f}"
+
+
+class _Cancelled(object):
+    """ stop flag of a search, set once a newer job has been given """
+
+    def __init__(self, latest, job):
+        self.latest = latest
+        self.job = job
+
+    def is_set(self):
+        return self.latest.value != self.job
+
+
+def _update(job, data, result, done):
+    board = Board.from_bytes(data)
+    white = board.playing == "w"
+    pv = []
+    for move in result.pv:
+        pv.append(move2san(board, move))
+        board.make_move(move)
+    return AnalysisUpdate(
+        job, result.depth, result.score if white else -result.score, pv,
+        [move2uci(move) for move in result.pv], result.nodes, done
+    )
+
+
+def _work(jobs, results, latest, options):
+    # loop of the worker process
+    table = TranspositionTable(options["hash_mb"])
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, data = job
+        if job_id != latest.value:
+            continue
+        board = Board.from_bytes(data)
+        if not board.legal_moves():
+            # nothing to search, report the mate or stalemate right away
+            score = -MATE if board.is_check() else 0
+            white = board.playing == "w"
+            results.put(AnalysisUpdate(job_id, 0, score if white else -score, [], [], 0, True))
+            continue
+        searcher = Searcher(
+            board, max_depth=options["depth"], time_limit=options["movetime"],
+            stop=_Cancelled(latest, job_id), table=table,
+            callback=lambda result: results.put(_update(job_id, data, result, False))
+        )
+        result = searcher.search()
+        if result.depth:
+            results.put(_update(job_id, data, result, True))
+
+
+class AnalysisWorker(object):
+    """
+    search positions in a background process
+
+    Parameters
+    ----------
+    depth : int, optional
+        maximum depth of each search
+    movetime : float, optional
+        seconds to search each position, None to search until the next
+        position or the depth is reached
+    hash_mb : float, optional
+        size of the transposition table of the worker, kept between
+        positions
+    """
+
+    def __init__(self, depth=None, movetime=30, hash_mb=16):
+        # a spawned process does not inherit the state of a GUI toolkit
+        context = multiprocessing.get_context("spawn")
+        self._jobs = context.Queue()
+        self._results = context.Queue()
+        self._latest = context.RawValue("q", 0)
+        options = {"depth": depth, "movetime": movetime, "hash_mb": hash_mb}
+        self._process = context.Process(
+            target=_work, args=(self._jobs, self._results, self._latest, options), daemon=True
+        )
+        self._process.start()
+        self.job = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def analyze(self, board):
+        """
+        start analyzing a board, stopping the analysis of the previous one
+
+        Returns
+        -------
+        job : int
+            number identifying the updates of this board
+        """
+        self.job += 1
+        self._latest.value = self.job
+        self._jobs.put((self.job, board.to_bytes()))
+        return self.job
+
+    def cancel(self):
+        """ stop analyzing """
+        self.job += 1
+        self._latest.value = self.job
+
+    def poll(self):
+        """
+        updates of the current board received since the last call, without
+        waiting
+
+        Returns
+        -------
+        updates : list of AnalysisUpdate
+        """
+        updates = []
+        while True:
+            try:
+                update = self._results.get_nowait()
+            except queue.Empty:
+                return updates
+            if update.job == self.job:
+                updates.append(update)
+
+    def close(self):
+        """ stop the worker process """
+        if self._process.is_alive():
+            self.cancel()
+            self._jobs.put(None)
+            self._process.join(1)
+            if self._process.is_alive():
+                self._process.terminate()
@@ -0,0 +1,325 @@
+"""
+analyze the positions of a FEN/EPD file or the games of a PGN file on
+all cores
+
+Work is read lazily from the input, cut into chunks of raw FEN lines or
+PGN game texts and fanned out to a process pool. Every worker process
+sets up its own Chess instance and transposition table once, so only the
+chunks and their results cross process boundaries. Results are written
+as JSON lines, either in input order or as soon as they are ready.
+
+With a checkpoint file, the id of every chunk whose results have been
+written is recorded, and a run started again with the same input, chunk
+size and checkpoint skips those chunks and appends to the output.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from bitboard import move2uci
+from chess import Chess
+from epd import parse_line
+from error import ChessError
+from history import History
+from pgn import game_texts, replay_games
+from san import move2san
+from search import search
+from transposition import TranspositionTable
+
+
+class TaskTimeout(Exception):
+    """ raised in a worker when a position or game takes too long """
+
+
+# per-process state of the workers, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(options):
+    _worker["chess"] = Chess()
+    _worker["options"] = options
+    _worker["table"] = (
+        TranspositionTable(options["hash_mb"]) if options["hash_mb"] else None
+    )
+    # the main process handles interrupts and shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker["deadline"] = None
+
+
+def _search(board):
+    # the timeout of the item is a time budget of the search, which stops
+    # between nodes with the board restored
+    options = _worker["options"]
+    time_limit = options["movetime"]
+    deadline = _worker["deadline"]
+    if deadline is not None:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise TaskTimeout()
+        time_limit = remaining if time_limit is None else min(time_limit, remaining)
+    result = search(
+        board, max_depth=options["depth"], time_limit=time_limit,
+        node_limit=options["nodes"], table=_worker["table"]
+    )
+    if deadline is not None and time.perf_counter() >= deadline:
+        raise TaskTimeout()
+    return result
+
+
+def analyze_position(line):
+    """ search a FEN or EPD position, scores are from the side to move """
+    position = parse_line(line)
+    chess = _worker["chess"]
+    chess.board.fen = position.fen
+    chess.history = History()
+    board = chess.board
+    result = _search(board)
+    record = {
+        "fen": position.fen,
+        "bestmove": None if result.move is None else move2uci(result.move),
+        "score": result.score,
+        "pv": [move2uci(move) for move in result.pv],
+        "depth": result.depth,
+        "nodes": result.nodes,
+        "seconds": round(result.seconds, 3),
+    }
+    if position.id is not None:
+        record["id"] = position.id
+    if result.move is not None and (position.bm or position.am):
+        san = move2san(board, result.move).rstrip("+#")
+        bm = [move.rstrip("+#!?") for move in position.bm]
+        am = [move.rstrip("+#!?") for move in position.am]
+        record["solved"] = (not bm or san in bm) and san not in am
+    return record
+
+
+def analyze_game(text):
+    """ search every position of the main line of a game, scores are from white """
+    replayed = next(replay_games(text.splitlines(True)))
+    chess = _worker["chess"]
+    chess.board.fen = replayed.headers.get("FEN", Chess.initial_fen)
+    chess.history = History()
+    board = chess.board
+    scores = []
+    bestmoves = []
+    for move in replayed.moves + [None]:
+        result = _search(board)
+        scores.append(result.score if board.playing == "w" else -result.score)
+        bestmoves.append(None if result.move is None else move2uci(result.move))
+        if move is not None:
+            chess.history.push(board.make_move(move))
+    return {
+        "headers": replayed.headers,
+        "result": replayed.result,
+        "moves": [move2uci(move) for move in replayed.moves],
+        "scores": scores,
+        "bestmoves": bestmoves,
+        "error": replayed.error,
+    }
+
+
+def _analyze_chunk(kind, chunk_id, start, items):
+    # results of the items of a chunk, a failing item does not fail the chunk
+    analyze = analyze_game if kind == "pgn" else analyze_position
+    timeout = _worker["options"]["timeout"]
+    results = []
+    for index, item in enumerate(items, start):
+        _worker["deadline"] = time.perf_counter() + timeout if timeout else None
+        try:
+            record = analyze(item)
+        except TaskTimeout:
+            record = {"error": f"timed out after {timeout} s"}
+        except ChessError as e:
+            record = {"error": f"{type(e).__name__}: {e}"}
+        results.append({"index": index, **record})
+    return chunk_id, results
+
+
+def read_items(path, kind):
+    """ raw FEN/EPD lines or PGN game texts of the input file """
+    if kind == "pgn":
+        yield from game_texts(path)
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and line[0] not in "#%":
+                yield line
+
+
+def _chunks(items, chunk_size):
+    items = iter(items)
+    for chunk_id in itertools.count():
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk_id, chunk_id * chunk_size, chunk
+
+
+def _load_checkpoint(path, header):
+    # ids of the chunks already written by a previous run
+    if path is None or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if not lines:
+        return set()
+    if json.loads(lines[0]) != header:
+        raise SystemExit(f"checkpoint {path} was written for another input or chunk size")
+    return {int(line) for line in lines[1:]}
+
+
+def run(path, output, kind, options, workers, chunk_size, ordered=True, checkpoint=None):
+    """
+    analyze a file on a process pool and write the results as JSON lines
+
+    Parameters
+    ----------
+    path : str
+        FEN/EPD or PGN file
+    output : file object
+        text file to write the results to
+    kind : str
+        "pgn" to analyze games, "fen" to analyze positions
+    options : dict
+        search options: depth, nodes, movetime, hash_mb and timeout
+    workers : int
+        number of worker processes
+    chunk_size : int
+        positions or games sent to a worker at once
+    ordered : bool, optional
+        write results in input order rather than as they are ready
+    checkpoint : str, optional
+        file recording finished chunks, to resume an interrupted run
+
+    Returns
+    -------
+    count : int
+        number of results written
+    """
+    header = {"input": os.path.abspath(path), "kind": kind, "chunk_size": chunk_size}
+    done = _load_checkpoint(checkpoint, header)
+    log = None
+    if checkpoint is not None:
+        log = open(checkpoint, "a")
+        if not done and log.tell() == 0:
+            log.write(json.dumps(header, separators=(",", ":")) + "\n")
+            log.flush()
+
+    def write(chunk_id, results):
+        for record in results:
+            output.write(json.dumps(record) + "\n")
+        output.flush()
+        if log is not None:
+            log.write(f"{chunk_id}\n")
+            log.flush()
+
+    chunks = (
+        chunk for chunk in _chunks(read_items(path, kind), chunk_size) if chunk[0] not in done
+    )
+    # bound the chunks held in memory: submitted, running or waiting to be
+    # written in order
+    limit = 2 * workers
+    pending = {}
+    finished = {}
+    order = deque()
+    count = 0
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(options,)) as pool:
+            while True:
+                while len(pending) + len(finished) < limit:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending[pool.submit(_analyze_chunk, kind, *chunk)] = chunk[0]
+                    if ordered:
+                        order.append(chunk[0])
+                if not pending:
+                    break
+                ready, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in ready:
+                    del pending[future]
+                    chunk_id, results = future.result()
+                    if ordered:
+                        finished[chunk_id] = results
+                    else:
+                        write(chunk_id, results)
+                        count += len(results)
+                while order and order[0] in finished:
+                    chunk_id = order.popleft()
+                    results = finished.pop(chunk_id)
+                    write(chunk_id, results)
+                    count += len(results)
+    finally:
+        if log is not None:
+            log.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyze positions or games on all cores")
+    parser.add_argument("input", help="FEN/EPD file, or PGN file to analyze whole games")
+    parser.add_argument("-o", "--output", help="JSON lines file, standard output by default")
+    parser.add_argument(
+        "--format", choices=["auto", "fen", "pgn"], default="auto",
+        help="input format, guessed from the file extension by default"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument(
+        "--chunk-size", type=int, default=16, help="positions or games per task"
+    )
+    parser.add_argument(
+        "--unordered", action="store_true", help="write results as soon as they are ready"
+    )
+    parser.add_argument("--checkpoint", help="file to record progress to and resume from")
+    parser.add_argument(
+        "--timeout", type=float, help="seconds allowed for each position or game"
+    )
+    parser.add_argument("--depth", type=int, default=3, help="search depth")
+    parser.add_argument("--nodes", type=int, help="node budget of each search")
+    parser.add_argument("--movetime", type=float, help="seconds for each search")
+    parser.add_argument(
+        "--hash", type=float, default=16, help="transposition table size in MB per worker"
+    )
+    args = parser.parse_args()
+
+    kind = args.format
+    if kind == "auto":
+        kind = "pgn" if args.input.lower().endswith(".pgn") else "fen"
+    options = {
+        "depth": args.depth,
+        "nodes": args.nodes,
+        "movetime": args.movetime,
+        "hash_mb": args.hash,
+        "timeout": args.timeout,
+    }
+    if args.checkpoint is not None and args.output is None:
+        parser.error("--checkpoint needs --output")
+
+    # only a run resumed from a checkpoint appends to its output
+    resuming = args.checkpoint is not None and os.path.exists(args.checkpoint)
+    if args.output is None:
+        output = sys.stdout
+    else:
+        output = open(args.output, "a" if resuming else "w")
+    try:
+        run(
+            args.input, output, kind, options, args.workers, args.chunk_size,
+            not args.unordered, args.checkpoint
+        )
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
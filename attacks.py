@@ -0,0 +1,131 @@
+"""
+attack tables built once at import time
+
+Leaper attacks are looked up per square. Sliding piece attacks are looked
+up per square in a dictionary keyed by the relevant occupancy, i.e. the
+occupied squares on the piece's rays excluding the board edge, which acts
+as a perfect hash of the occupancy.
+"""
+
+from itertools import product
+
+KNIGHT_DIRECTIONS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+KING_DIRECTIONS = [(1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+ROOK_DIRECTIONS = [(1, 0), (0, -1), (-1, 0), (0, 1)]
+
+
+def _step(square, direction):
+    # direction is (rank step, file step), returns None when off the board
+    rank = (square >> 3) + direction[0]
+    file = (square & 7) + direction[1]
+    if -1 < rank < 8 and -1 < file < 8:
+        return 8 * rank + file
+    return None
+
+
+def _ray(square, direction):
+    squares = []
+    while True:
+        square = _step(square, direction)
+        if square is None:
+            return squares
+        squares.append(square)
+
+
+def _leaper_attacks(directions):
+    table = []
+    for square in range(64):
+        attacks = 0
+        for direction in directions:
+            dest = _step(square, direction)
+            if dest is not None:
+                attacks |= 1 << dest
+        table.append(attacks)
+    return table
+
+
+def _ray_table(ray):
+    # attacks along a single ray for every occupancy of its relevant squares
+    relevant = ray[:-1]
+    table = {}
+    for bits in range(1 << len(relevant)):
+        occupancy = 0
+        for i, square in enumerate(relevant):
+            if bits >> i & 1:
+                occupancy |= 1 << square
+        attacks = 0
+        for square in ray:
+            attacks |= 1 << square
+            if occupancy >> square & 1:
+                break
+        table[occupancy] = attacks
+    return table
+
+
+def _slider_tables(directions):
+    masks = []
+    tables = []
+    for square in range(64):
+        ray_tables = [_ray_table(_ray(square, d)) for d in directions]
+        mask = 0
+        for ray_table in ray_tables:
+            for occupancy in ray_table:
+                mask |= occupancy
+        table = {}
+        for entries in product(*[ray_table.items() for ray_table in ray_tables]):
+            occupancy = 0
+            attacks = 0
+            for ray_occupancy, ray_attacks in entries:
+                occupancy |= ray_occupancy
+                attacks |= ray_attacks
+            table[occupancy] = attacks
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_DIRECTIONS)
+KING_ATTACKS = _leaper_attacks(KING_DIRECTIONS)
+# squares attacked by a pawn of each color (white, black) standing on a square
+PAWN_ATTACKS = [_leaper_attacks([(1, -1), (1, 1)]), _leaper_attacks([(-1, -1), (-1, 1)])]
+
+BISHOP_MASKS, BISHOP_TABLES = _slider_tables(BISHOP_DIRECTIONS)
+ROOK_MASKS, ROOK_TABLES = _slider_tables(ROOK_DIRECTIONS)
+
+
+def _line_tables():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        for direction in BISHOP_DIRECTIONS + ROOK_DIRECTIONS:
+            opposite = (-direction[0], -direction[1])
+            full = 1 << square
+            for dest in _ray(square, direction) + _ray(square, opposite):
+                full |= 1 << dest
+            squares = 0
+            for dest in _ray(square, direction):
+                between[square][dest] = squares
+                line[square][dest] = full
+                squares |= 1 << dest
+    return between, line
+
+
+# squares strictly between two aligned squares and the whole line through
+# them, zero if the squares are not on a common rank, file or diagonal
+BETWEEN, LINE = _line_tables()
+
+
+def bishop_attacks(square, occupied):
+    return BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+
+
+def rook_attacks(square, occupied):
+    return ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+
+
+def queen_attacks(square, occupied):
+    return (
+        BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+        | ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+    )
@@ -0,0 +1,212 @@
+"""
+evaluation of many positions at once with NumPy
+
+FENs are parsed straight into an (N, 64) uint8 array of piece codes,
+0 for an empty square and 1 + piece index (bitboard.PIECE_LETTERS)
+otherwise, with squares indexed from a1 = 0. Evaluation terms are then
+computed for the whole batch with array operations, without building a
+Board for each position.
+"""
+
+import numpy as np
+from attacks import KING_ATTACKS, KNIGHT_ATTACKS
+from bitboard import FILE_A, FILE_H, PIECE_LETTERS
+from error import InvalidFEN
+from evaluation import PIECE_VALUES, SQUARE_SCORES
+
+# expand a FEN placement into 64 characters, rank 8 first
+_EXPAND = str.maketrans({**{str(n): "." * n for n in range(1, 9)}, "/": None})
+
+# piece code of each ASCII character of an expanded placement, 255 if invalid
+_CODES = np.full(256, 255, dtype=np.uint8)
+_CODES[ord(".")] = 0
+for _index, _letter in enumerate(PIECE_LETTERS):
+    _CODES[ord(_letter)] = _index + 1
+
+# material of each piece code, positive for white
+MATERIAL = np.array(
+    [0] + PIECE_VALUES + [-value for value in PIECE_VALUES], dtype=np.int32
+)
+# material plus piece-square table bonus of each piece code and square
+SQUARE_SCORES_TABLE = np.array([[0] * 64] + SQUARE_SCORES, dtype=np.int32)
+
+_SQUARES = np.arange(64)
+_BITS = np.left_shift(np.uint64(1), _SQUARES.astype(np.uint64))
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_KNIGHT_ATTACKS = np.array(KNIGHT_ATTACKS, dtype=np.uint64)
+_KING_ATTACKS = np.array(KING_ATTACKS, dtype=np.uint64)
+_NOT_FILE_A = np.uint64(0xFFFFFFFFFFFFFFFF ^ FILE_A)
+_NOT_FILE_H = np.uint64(0xFFFFFFFFFFFFFFFF ^ FILE_H)
+_ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+# (shift, mask of squares a step may land on), positive shifts go up the board
+_BISHOP_STEPS = [(9, _NOT_FILE_A), (7, _NOT_FILE_H), (-7, _NOT_FILE_A), (-9, _NOT_FILE_H)]
+_ROOK_STEPS = [(8, _ALL), (-8, _ALL), (1, _NOT_FILE_A), (-1, _NOT_FILE_H)]
+
+
+def parse_fens(fens):
+    """
+    parse FENs into piece codes
+
+    Parameters
+    ----------
+    fens : iterable of str
+        positions in FEN, only the placement and side to move are used
+
+    Returns
+    -------
+    squares : numpy.ndarray
+        (N, 64) uint8 piece codes, a1 = 0
+    white : numpy.ndarray
+        (N,) bool, True where white is to move
+    """
+    fens = list(fens)
+    placements = []
+    white = []
+    for fen in fens:
+        fields = fen.split()
+        if len(fields) < 2 or fields[1] not in ("w", "b"):
+            raise InvalidFEN(f"Invalid FEN: {fen}")
+        placement = fields[0].translate(_EXPAND)
+        if len(placement) != 64:
+            raise InvalidFEN(f"Invalid FEN: {fen}")
+        placements.append(placement)
+        white.append(fields[1] == "w")
+    raw = np.frombuffer("".join(placements).encode("ascii", "replace"), dtype=np.uint8)
+    squares = _CODES[raw].reshape(-1, 8, 8)
+    if (squares == 255).any():
+        bad = int(np.nonzero((squares == 255).any(axis=(1, 2)))[0][0])
+        raise InvalidFEN(f"Invalid FEN: {fens[bad]}")
+    # FEN lists rank 8 first
+    return squares[:, ::-1, :].reshape(-1, 64), np.array(white, dtype=bool)
+
+
+def planes(squares):
+    """ one-hot (N, 12, 64) uint8 planes, one per piece index """
+    codes = np.arange(1, 13, dtype=np.uint8)
+    return (squares[:, None, :] == codes[None, :, None]).view(np.uint8)
+
+
+def bitboards(squares):
+    """ (N, 12) uint64 bitboards, one per piece index """
+    return (planes(squares) * _BITS).sum(axis=2, dtype=np.uint64)
+
+
+def popcount(values):
+    """ number of set bits of each uint64 """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def material(squares):
+    """ material balance in centipawns from white's point of view, (N,) int32 """
+    return MATERIAL[squares].sum(axis=1, dtype=np.int32)
+
+
+def piece_square(squares):
+    """ piece-square table bonus from white's point of view, (N,) int32 """
+    return SQUARE_SCORES_TABLE[squares, _SQUARES].sum(axis=1, dtype=np.int32) - material(squares)
+
+
+def _shift(values, shift):
+    if shift > 0:
+        return np.left_shift(values, np.uint64(shift))
+    return np.right_shift(values, np.uint64(-shift))
+
+
+def _slider_attacks(pieces, empty, steps):
+    # Kogge-Stone fill in each direction from single-bit piece boards
+    attacks = np.zeros_like(pieces)
+    for step, mask in steps:
+        generator = pieces
+        propagator = empty & mask
+        generator = generator | (propagator & _shift(generator, step))
+        propagator = propagator & _shift(propagator, step)
+        generator = generator | (propagator & _shift(generator, 2 * step))
+        propagator = propagator & _shift(propagator, 2 * step)
+        generator = generator | (propagator & _shift(generator, 4 * step))
+        attacks |= _shift(generator, step) & mask
+    return attacks
+
+
+def mobility(squares):
+    """
+    pseudo-legal mobility of knights, bishops, rooks, queens and kings
+
+    Returns
+    -------
+    counts : numpy.ndarray
+        (N, 2) number of squares each side's pieces attack that are not
+        occupied by their own pieces, white first
+    """
+    boards = bitboards(squares)
+    occupancy = np.stack([boards[:, :6].sum(axis=1), boards[:, 6:].sum(axis=1)], axis=1)
+    empty = ~(occupancy[:, 0] | occupancy[:, 1])
+
+    # work on the pieces only rather than on all squares of the batch
+    rows, columns = np.nonzero(squares)
+    codes = squares[rows, columns]
+    colors = (codes > 6).astype(np.intp)
+    types = (codes - 1) % 6
+    attacks = np.zeros(len(rows), dtype=np.uint64)
+    for piece_type, table in [(1, _KNIGHT_ATTACKS), (5, _KING_ATTACKS)]:
+        selected = types == piece_type
+        attacks[selected] = table[columns[selected]]
+    for selected, steps in [
+            ((types == 2) | (types == 4), _BISHOP_STEPS),
+            ((types == 3) | (types == 4), _ROOK_STEPS)]:
+        attacks[selected] |= _slider_attacks(
+            _BITS[columns[selected]], empty[rows[selected]], steps
+        )
+    moves = popcount(attacks & ~occupancy[rows, colors])
+    counts = np.bincount(2 * rows + colors, weights=moves, minlength=2 * len(squares))
+    return counts.astype(np.int64).reshape(-1, 2)
+
+
+def evaluate(squares, white, mobility_weight=0):
+    """
+    evaluate a batch of positions
+
+    With the default ``mobility_weight`` the scores equal those of
+    ``evaluation.evaluate``.
+
+    Parameters
+    ----------
+    squares : numpy.ndarray
+        (N, 64) piece codes as returned by ``parse_fens``
+    white : numpy.ndarray
+        (N,) bool, True where white is to move
+    mobility_weight : int, optional
+        centipawns per square of mobility
+
+    Returns
+    -------
+    scores : numpy.ndarray
+        (N,) int32 scores in centipawns from the point of view of the side to move
+    """
+    scores = SQUARE_SCORES_TABLE[squares, _SQUARES].sum(axis=1, dtype=np.int32)
+    if mobility_weight:
+        counts = mobility(squares)
+        scores += (mobility_weight * (counts[:, 0] - counts[:, 1])).astype(np.int32)
+    return np.where(white, scores, -scores)
+
+
+def evaluate_fens(fens, mobility_weight=0, chunk_size=65536):
+    """
+    evaluate positions given in FEN, in chunks to bound memory use
+
+    Returns
+    -------
+    scores : numpy.ndarray
+        (N,) int32 scores in centipawns from the point of view of the side to move
+    """
+    fens = iter(fens)
+    results = []
+    while True:
+        chunk = [fen for _, fen in zip(range(chunk_size), fens)]
+        if not chunk:
+            break
+        squares, white = parse_fens(chunk)
+        results.append(evaluate(squares, white, mobility_weight))
+    if not results:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(results)
@@ -0,0 +1,99 @@
+"""
+helpers for the bitboard board representation
+
+Squares are numbered from 0 (a1) to 63 (h8) rank by rank, so that bit
+``1 << square`` of a 64-bit integer stands for that square.
+"""
+
+files = ["a", "b", "c", "d", "e", "f", "g", "h"]
+ranks = ["1", "2", "3", "4", "5", "6", "7", "8"]
+
+# square index <-> algebraic notation
+SQUARES = [file + rank for rank in ranks for file in files]
+SQUARE_INDEX = {notation: index for index, notation in enumerate(SQUARES)}
+
+WHITE = 0
+BLACK = 1
+COLOR_INDEX = {"w": WHITE, "b": BLACK}
+
+# piece types, their order also serves as the promotion code of a move
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+# piece index = 6 * color + piece type
+PIECE_LETTERS = "PNBRQKpnbrqk"
+PIECE_INDEX = {letter: index for index, letter in enumerate(PIECE_LETTERS)}
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+LIGHT_SQUARES = 0x55AA55AA55AA55AA
+
+
+def bit(square):
+    return 1 << square
+
+
+def square_file(square):
+    return square & 7
+
+
+def square_rank(square):
+    return square >> 3
+
+
+def lsb(bitboard):
+    """ index of the least significant set bit """
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+def popcount(bitboard):
+    return bin(bitboard).count("1")
+
+
+def iter_squares(bitboard):
+    """ yields indices of set bits from the least significant one """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def squares2notations(bitboard):
+    return [SQUARES[square] for square in iter_squares(bitboard)]
+
+
+# moves are encoded in 15 bits: origin | destination << 6 | promotion << 12,
+# where promotion is the piece type promoted to (0 if none)
+PROMOTION_LETTERS = {KNIGHT: "n", BISHOP: "b", ROOK: "r", QUEEN: "q"}
+PROMOTION_TYPES = {letter: type_ for type_, letter in PROMOTION_LETTERS.items()}
+
+
+def encode_move(origin, destination, promotion=0):
+    return origin | destination << 6 | promotion << 12
+
+
+def move_origin(move):
+    return move & 63
+
+
+def move_destination(move):
+    return move >> 6 & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def move2uci(move):
+    """ long algebraic notation of an encoded move, e.g. "e2e4" or "e7e8q" """
+    uci = SQUARES[move & 63] + SQUARES[move >> 6 & 63]
+    if move >> 12:
+        uci += PROMOTION_LETTERS[move >> 12]
+    return uci
+
+
+def uci2move(uci):
+    promotion = PROMOTION_TYPES[uci[4]] if len(uci) == 5 else 0
+    return encode_move(SQUARE_INDEX[uci[:2]], SQUARE_INDEX[uci[2:4]], promotion)
@@ -1,9 +1,73 @@
+from collections import namedtuple
+from attacks import (
+    BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, LINE, PAWN_ATTACKS,
+    bishop_attacks, queen_attacks, rook_attacks
+)
+from bitboard import (
+    BISHOP, COLOR_INDEX, FULL, KING, KNIGHT, LIGHT_SQUARES, PAWN, PIECE_INDEX,
+    PIECE_LETTERS, PROMOTION_LETTERS, QUEEN, ROOK, SQUARE_INDEX, SQUARES, iter_squares, lsb,
+    move_destination, move_origin, move_promotion, squares2notations
+)
 from error import ColorError, InvalidFEN, InvalidNotation
+from packing import pack_position, unpack_position
 from piece import abbr2piece
+from zobrist import CASTLING_KEYS, PIECE_KEYS, TURN_KEY, ep_key
+
+
+# binary digits of the per-square attacker counts, no square can be attacked
+# by more than 19 pieces of a color (8 rays, 8 knights, 2 pawns and a king)
+ATTACK_COUNT_BITS = 5
+
+# castling rights are kept as bits of an integer in the order of "KQkq"
+CASTLING_LETTERS = "KQkq"
+CASTLING_STRINGS = [
+    "".join(c for i, c in enumerate(CASTLING_LETTERS) if rights >> i & 1) or "-"
+    for rights in range(16)
+]
+
+# castling rights that survive a move from or to each square
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[SQUARE_INDEX["e1"]] = 15 ^ 3
+CASTLING_MASKS[SQUARE_INDEX["h1"]] = 15 ^ 1
+CASTLING_MASKS[SQUARE_INDEX["a1"]] = 15 ^ 2
+CASTLING_MASKS[SQUARE_INDEX["e8"]] = 15 ^ 12
+CASTLING_MASKS[SQUARE_INDEX["h8"]] = 15 ^ 4
+CASTLING_MASKS[SQUARE_INDEX["a8"]] = 15 ^ 8
+
+
+# information needed to take a move back
+# captured : piece captured by the move (None if no capture)
+# castling : castling rights before the move
+# enpassant : en passant target square before the move (None if not available)
+# halfmove_clock : halfmove clock before the move
+# promoted : pawn replaced by the promotion (None if not a promotion)
+Undo = namedtuple(
+    "Undo", ["move", "captured", "castling", "enpassant", "halfmove_clock", "promoted"]
+)
 
 
 class Board(object):
-    """ Board class for a chess board position """
+    """
+    Board class for a chess board position
+
+    The position is kept as twelve piece bitboards (indexed as in
+    ``bitboard.PIECE_LETTERS``) plus occupancy masks of each color, next to
+    a 64-element list of the piece objects indexed by square.
+
+    Attack maps are updated incrementally whenever a piece is put on or
+    removed from a square: the attacks of each piece, the number of pieces
+    of each color attacking each square, stored bit-sliced as one bitboard
+    per binary digit, and the bitboard of squares attacked by each color.
+
+    The Zobrist key of the position (see ``zobrist``) is kept in
+    ``zobrist_key`` and updated along with every change of the position,
+    and the number of pieces of each kind in ``piece_counts``.
+
+    ``repetitions`` counts the keys of the positions reached by
+    ``make_move`` since the last capture or pawn move, as no position
+    before such a move can occur again. Positions set up otherwise start
+    a new count.
+    """
 
     rows = 8
     columns = 8
@@ -13,27 +77,217 @@ class Board(object):
     pieces = ["k", "q", "r", "b", "n", "p", "K", "Q", "R", "B", "N", "P"]
 
     def __init__(self, fen):
-        self._board = {}
         self.fen = fen
 
+    @classmethod
+    def from_bitboards(
+            cls, bitboards, playing, castling, ep_square, halfmove_clock, fullmove_number):
+        """
+        board of a position given as piece bitboards and state
+
+        Parameters
+        ----------
+        bitboards : sequence
+            12 piece bitboards indexed as ``bitboard.PIECE_LETTERS``
+        playing : str
+            "w" or "b"
+        castling : int
+            castling rights as bits in the order of "KQkq"
+        ep_square : int or None
+            en passant target square
+        halfmove_clock, fullmove_number : int
+            move clocks
+        """
+        board = cls.__new__(cls)
+        board._clear()
+        for index, bitboard in enumerate(bitboards):
+            for square in iter_squares(bitboard):
+                board._put(square, abbr2piece(PIECE_LETTERS[index]))
+        board.playing = playing
+        board.castling = CASTLING_STRINGS[castling]
+        board.enpassant_target = "-" if ep_square is None else SQUARES[ep_square]
+        board.halfmove_clock = halfmove_clock
+        board.fullmove_number = fullmove_number
+        board.reset_repetitions()
+        return board
+
+    @classmethod
+    def from_bytes(cls, data):
+        """ board of a position encoded by ``to_bytes`` """
+        return cls.from_bitboards(*unpack_position(data))
+
+    def to_bytes(self):
+        """ position in the 32-byte encoding of ``packing`` """
+        return pack_position(
+            self.bitboards, self._playing, self.castling_rights, self.ep_square,
+            self._halfmove_clock, self._fullmove_number
+        )
+
+    def __reduce__(self):
+        # pickle as the packed position rather than the piece objects
+        return self.from_bytes, (self.to_bytes(),)
+
     def __repr__(self):
         return self.fen
 
     def __getitem__(self, notation):
-        self.isvalid_notation(notation)
-        return self._board[notation]
+        try:
+            return self._board[SQUARE_INDEX[notation]]
+        except (KeyError, TypeError):
+            self.isvalid_notation(notation)
+            raise
 
     def __setitem__(self, notation, piece):
-        self.isvalid_notation(notation)
-        self._board[notation] = piece
+        try:
+            square = SQUARE_INDEX[notation]
+        except (KeyError, TypeError):
+            self.isvalid_notation(notation)
+            raise
+        # pieces next to the en passant target affect its hashing
+        self._fen = None
+        self.zobrist_key ^= ep_key(self)
+        self._remove(square)
+        if piece is not None:
+            self._put(square, piece)
+        self.zobrist_key ^= ep_key(self)
+
+    def _clear(self):
+        # empty board with black to move, no castling and no en passant
+        self._board = [None] * 64
+        self.bitboards = [0] * 12
+        self.piece_counts = [0] * 12
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.piece_attacks = [0] * 64
+        self.attack_counts = [[0] * ATTACK_COUNT_BITS, [0] * ATTACK_COUNT_BITS]
+        self.attacked = [0, 0]
+        self._playing = "b"
+        self.castling_rights = 0
+        self.ep_square = None
+        self.zobrist_key = 0
+
+    def _put(self, square, piece, update=True):
+        # update=False skips recomputing sliders, which is only valid if
+        # the square was occupied before the piece was removed from it
+        mask = 1 << square
+        index = piece.index
+        color = index // 6
+        self._board[square] = piece
+        self.bitboards[index] |= mask
+        self.piece_counts[index] += 1
+        self.occupancy[color] |= mask
+        self.occupied |= mask
+        self.zobrist_key ^= PIECE_KEYS[index][square]
+        if update:
+            self._update_sliders(square)
+
+        attacks = self._attacks_from(square, index)
+        self.piece_attacks[square] = attacks
+        self._add_attacks(color, attacks)
+
+    def _remove(self, square, update=True):
+        piece = self._board[square]
+        if piece is None:
+            return
+        mask = ~(1 << square)
+        index = piece.index
+        color = index // 6
+        self._board[square] = None
+        self.bitboards[index] &= mask
+        self.piece_counts[index] -= 1
+        self.occupancy[color] &= mask
+        self.occupied &= mask
+        self.zobrist_key ^= PIECE_KEYS[index][square]
+
+        self._remove_attacks(color, self.piece_attacks[square])
+        self.piece_attacks[square] = 0
+        if update:
+            self._update_sliders(square)
+
+    def _relocate(self, origin, dest):
+        # move a piece, capturing the one on the destination if any
+        piece = self._board[origin]
+        self._remove(origin)
+        if self._board[dest] is None:
+            self._put(dest, piece)
+        else:
+            self._remove(dest, update=False)
+            self._put(dest, piece, update=False)
+
+    def _attacks_from(self, square, index):
+        piece_type = index % 6
+        if piece_type == PAWN:
+            return PAWN_ATTACKS[index // 6][square]
+        elif piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[square]
+        elif piece_type == BISHOP:
+            return bishop_attacks(square, self.occupied)
+        elif piece_type == ROOK:
+            return rook_attacks(square, self.occupied)
+        elif piece_type == QUEEN:
+            return queen_attacks(square, self.occupied)
+        return KING_ATTACKS[square]
+
+    def _update_sliders(self, square):
+        # recompute sliding pieces whose rays pass through the changed square
+        bitboards = self.bitboards
+        occupied = self.occupied
+        diagonal = bitboards[2] | bitboards[4] | bitboards[8] | bitboards[10]
+        straight = bitboards[3] | bitboards[4] | bitboards[9] | bitboards[10]
+        sliders = (
+            bishop_attacks(square, occupied) & diagonal
+            | rook_attacks(square, occupied) & straight
+        )
+        while sliders:
+            lowest = sliders & -sliders
+            sliders ^= lowest
+            slider = lowest.bit_length() - 1
+            old = self.piece_attacks[slider]
+            new = 0
+            if diagonal & lowest:
+                new = bishop_attacks(slider, occupied)
+            if straight & lowest:
+                new |= rook_attacks(slider, occupied)
+            if new != old:
+                color = 0 if self.occupancy[0] & lowest else 1
+                self.piece_attacks[slider] = new
+                if old & ~new:
+                    self._remove_attacks(color, old & ~new)
+                if new & ~old:
+                    self._add_attacks(color, new & ~old)
+
+    def _add_attacks(self, color, attacks):
+        # attacker counts are bit-sliced, ripple-carry the added squares
+        counts = self.attack_counts[color]
+        self.attacked[color] |= attacks
+        for digit in range(ATTACK_COUNT_BITS):
+            if not attacks:
+                break
+            counts[digit], attacks = counts[digit] ^ attacks, counts[digit] & attacks
+
+    def _remove_attacks(self, color, attacks):
+        counts = self.attack_counts[color]
+        for digit in range(ATTACK_COUNT_BITS):
+            if not attacks:
+                break
+            counts[digit], attacks = counts[digit] ^ attacks, ~counts[digit] & attacks
+        self.attacked[color] = counts[0] | counts[1] | counts[2] | counts[3] | counts[4]
+
+    def attack_count(self, notation, color):
+        """ number of pieces of a color ("w" or "b") attacking a square """
+        square = SQUARE_INDEX[notation]
+        counts = self.attack_counts[COLOR_INDEX[color]]
+        return sum((counts[digit] >> square & 1) << digit for digit in range(ATTACK_COUNT_BITS))
 
     @property
     def fen(self):
+        # generated on first access after the position has changed
+        if self._fen is None:
+            self._fen = self.encode_fen()
         return self._fen
 
     @fen.setter
     def fen(self, fen):
-        self._fen = fen
         fen_blocks = fen.split(sep=" ")
 
         if len(fen_blocks) != 6:
@@ -54,49 +308,61 @@ class Board(object):
         self.enpassant_target = fen_blocks[3]
         self.halfmove_clock = int(fen_blocks[4])
         self.fullmove_number = int(fen_blocks[5])
+        self.reset_repetitions()
+        self._fen = fen
 
     def decode_fen_placement(self, fen_placement):
-        for i in range(1, 9):
-            fen_placement = fen_placement.replace(str(i), "-" * i)
-
         fen_placement_rows = fen_placement.split(sep="/")
         if len(fen_placement_rows) != 8:
             raise InvalidFEN("There must be eight ranks")
 
+        self._clear()
         for rank, fen_placement_row in zip(self.ranks, fen_placement_rows):
-            if len(fen_placement_row) != 8:
+            file = 0
+            for letter in fen_placement_row:
+                if letter.isdigit():
+                    file += int(letter)
+                    continue
+                if file > 7:
+                    raise InvalidFEN("Rank must have eight locations")
+                abbr2piece(letter).place_at(self.files[file] + rank, self)
+                file += 1
+            if file != 8:
                 raise InvalidFEN("Rank must have eight locations")
-            for file, letter in zip(self.files, fen_placement_row):
-                piece = abbr2piece(letter)
-                if piece is None:
-                    self[file + rank] = piece
-                else:
-                    piece.place_at(file + rank, self)
 
     def update_fen(self):
-        fen = ""
-        for rank in self.ranks:
+        self._fen = self.encode_fen()
+
+    def encode_fen(self):
+        rows = []
+        board = self._board
+        occupied = self.occupied
+        for start in range(56, -1, -8):
+            if not occupied >> start & 0xFF:
+                rows.append("8")
+                continue
+            row = []
             vacant = 0
-            for file in self.files:
-                piece = self[file + rank]
+            for piece in board[start:start + 8]:
                 if piece is None:
                     vacant += 1
                 else:
                     if vacant != 0:
-                        fen += str(vacant)
+                        row.append(str(vacant))
                         vacant = 0
-                    fen += repr(piece)
+                    row.append(piece.abbreviation)
             if vacant != 0:
-                fen += str(vacant)
-            fen += "/"
-
-        fen = fen[:-1]  # remove trailing /
-        fen += " " + self.playing
-        fen += " " + self.castling
-        fen += " " + self.enpassant_target
-        fen += " " + str(self.halfmove_clock)
-        fen += " " + str(self.fullmove_number)
-        self._fen = fen
+                row.append(str(vacant))
+            rows.append("".join(row))
+
+        return " ".join([
+            "/".join(rows),
+            self._playing,
+            CASTLING_STRINGS[self.castling_rights],
+            self.enpassant_target,
+            str(self._halfmove_clock),
+            str(self._fullmove_number)
+        ])
 
     @property
     def playing(self):
@@ -106,20 +372,60 @@ class Board(object):
     def playing(self, color):
         if color not in self.players:
             raise ColorError(f"Unknown player: {color}")
-        self._playing = color
+        self._fen = None
+        if color != self._playing:
+            self.zobrist_key ^= ep_key(self) ^ TURN_KEY
+            self._playing = color
+            self.zobrist_key ^= ep_key(self)
 
     @property
     def castling(self):
-        return self._castling
+        return CASTLING_STRINGS[self.castling_rights]
 
     @castling.setter
     def castling(self, string):
         if string == "":
             string = "-"
+        rights = 0
         if string != "-":
             if any(char not in ["K", "Q", "k", "q"] for char in string):
                 raise InvalidFEN("Unrecognizable castling avalability")
-        self._castling = string
+            for char in string:
+                rights |= 1 << CASTLING_LETTERS.index(char)
+        self.zobrist_key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[rights]
+        self.castling_rights = rights
+        self._fen = None
+
+    @property
+    def enpassant_target(self):
+        if self.ep_square is None:
+            return "-"
+        return SQUARES[self.ep_square]
+
+    @enpassant_target.setter
+    def enpassant_target(self, notation):
+        self.zobrist_key ^= ep_key(self)
+        self.ep_square = None if notation == "-" else SQUARE_INDEX[notation]
+        self.zobrist_key ^= ep_key(self)
+        self._fen = None
+
+    @property
+    def halfmove_clock(self):
+        return self._halfmove_clock
+
+    @halfmove_clock.setter
+    def halfmove_clock(self, clock):
+        self._halfmove_clock = clock
+        self._fen = None
+
+    @property
+    def fullmove_number(self):
+        return self._fullmove_number
+
+    @fullmove_number.setter
+    def fullmove_number(self, number):
+        self._fullmove_number = number
+        self._fen = None
 
     def isvalid_notation(self, notation):
         if not isinstance(notation, str):
@@ -130,41 +436,39 @@ class Board(object):
             raise InvalidNotation(f"Unknown file: {notation}")
         if notation[1] not in self.ranks:
             raise InvalidNotation(f"Unknown rank: {notation}")
+        return True
 
     def destination(self, origin, direction):
-        index = self.files.index(origin[0]) + direction[1]
-        if not -1 < index < 8:
+        square = SQUARE_INDEX[origin]
+        file = (square & 7) + direction[1]
+        rank = (square >> 3) - direction[0]
+        if not (-1 < file < 8 and -1 < rank < 8):
             return None
-        dest_file = self.files[index]
 
-        index = self.ranks.index(origin[1]) + direction[0]
-        if not -1 < index < 8:
+        dest = 8 * rank + file
+        piece = self._board[square]
+        if piece is not None and self.occupancy[COLOR_INDEX[piece.color]] >> dest & 1:
             return None
-        dest_rank = self.ranks[index]
-
-        dest = dest_file + dest_rank
-        if self.issamecolor(origin, dest):
-            return None
-        return dest
+        return SQUARES[dest]
 
     def issamecolor(self, origin, destination):
-        if self[origin] is None or self[destination] is None:
-            return False
-        elif self[origin].color == self[destination].color:
-            return True
-        return False
+        origin = SQUARE_INDEX[origin]
+        destination = SQUARE_INDEX[destination]
+        return any(mask >> origin & mask >> destination & 1 for mask in self.occupancy)
 
     def isdifferentcolor(self, origin, destination):
-        if self[origin] is None or self[destination] is None:
-            return False
-        elif self[origin].color == self[destination].color:
-            return False
-        return True
+        white, black = self.occupancy
+        origin = SQUARE_INDEX[origin]
+        destination = SQUARE_INDEX[destination]
+        return bool(
+            white >> origin & black >> destination & 1
+            or black >> origin & white >> destination & 1
+        )
 
     def king_position(self, color):
-        for pos, piece in self._board.items():
-            if piece is not None and piece.name == "King" and piece.color == color:
-                return pos
+        king = self.bitboards[PIECE_INDEX["K" if color == "w" else "k"]]
+        if king:
+            return SQUARES[lsb(king)]
         color = "white" if color == "w" else "black"
         raise InvalidFEN(f"No king found for {color}")
 
@@ -182,8 +486,395 @@ class Board(object):
         squares : list
             list of attacked squares
         """
-        squares = []
-        for piece in self._board.values():
-            if piece is not None and piece.color != color:
-                squares.extend(piece.attacking_squares())
-        return squares
+        return squares2notations(self.attacks_by(1 - COLOR_INDEX[color]))
+
+    def attacks_by(self, color):
+        """
+        bitboard of the squares attacked by the pieces of a color
+
+        Parameters
+        ----------
+        color : int
+            bitboard.WHITE or bitboard.BLACK
+
+        Returns
+        -------
+        attacks : int
+            attacked squares including the ones of the same color
+        """
+        return self.attacked[color]
+
+    def is_attacked(self, notation, color):
+        """ whether a square is attacked by the pieces of a color ("w" or "b") """
+        return bool(self.attacked[COLOR_INDEX[color]] >> SQUARE_INDEX[notation] & 1)
+
+    def is_check(self):
+        """ whether the side to move is in check """
+        us = COLOR_INDEX[self._playing]
+        return bool(self.attacked[1 - us] & self.bitboards[6 * us + KING])
+
+    def reset_repetitions(self):
+        """ start counting repetitions from the current position """
+        self.repetitions = {self.zobrist_key: 1}
+        self._saved_repetitions = []
+
+    def repetition_count(self):
+        """ number of times the current position has occurred """
+        return self.repetitions.get(self.zobrist_key, 0)
+
+    def is_repetition(self, count=3):
+        """ whether the current position has occurred at least count times """
+        return self.repetitions.get(self.zobrist_key, 0) >= count
+
+    def is_fifty_moves(self):
+        """ whether fifty moves of each side were played without capture or pawn move """
+        return self._halfmove_clock >= 100
+
+    def is_insufficient_material(self):
+        """
+        whether neither side has the pieces to checkmate, that is only kings
+        and at most one minor piece, or only kings and bishops all on
+        squares of the same color
+        """
+        counts = self.piece_counts
+        if counts[PAWN] or counts[ROOK] or counts[QUEEN]:
+            return False
+        if counts[6 + PAWN] or counts[6 + ROOK] or counts[6 + QUEEN]:
+            return False
+        knights = counts[KNIGHT] + counts[6 + KNIGHT]
+        bishops = counts[BISHOP] + counts[6 + BISHOP]
+        if knights + bishops <= 1:
+            return True
+        if knights:
+            return False
+        bishops = self.bitboards[BISHOP] | self.bitboards[6 + BISHOP]
+        return not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES
+
+    def is_checkmate(self):
+        """ whether the side to move is checkmated """
+        return self.is_check() and not self.legal_moves()
+
+    def is_stalemate(self):
+        """ whether the side to move is not in check and has no legal move """
+        return not self.is_check() and not self.legal_moves()
+
+    def is_draw(self):
+        """
+        whether the game is drawn by stalemate, threefold repetition, the
+        fifty-move rule or insufficient material
+        """
+        return self.result() == "1/2-1/2"
+
+    def result(self):
+        """
+        result of the game in the notation of PGN
+
+        Returns
+        -------
+        result : str
+            "1-0" or "0-1" after checkmate, "1/2-1/2" if the game is drawn
+            (see ``is_draw``), "*" if it goes on
+        """
+        if self.is_repetition() or self.is_insufficient_material():
+            return "1/2-1/2"
+        if not self.legal_moves():
+            if not self.is_check():
+                return "1/2-1/2"
+            return "0-1" if self._playing == "w" else "1-0"
+        # checkmate on the last of the fifty moves still wins
+        if self.is_fifty_moves():
+            return "1/2-1/2"
+        return "*"
+
+    def attackers(self, notation, color):
+        """ notations of the pieces of a color ("w" or "b") attacking a square """
+        return squares2notations(self.attackers_to(SQUARE_INDEX[notation], COLOR_INDEX[color]))
+
+    def attackers_to(self, square, color, occupied=None):
+        """
+        bitboard of the pieces of a color attacking a square
+
+        Parameters
+        ----------
+        square : int
+            index of the attacked square
+        color : int
+            bitboard.WHITE or bitboard.BLACK
+        occupied : int, optional
+            occupancy to use for sliding pieces, the current one by default
+
+        Returns
+        -------
+        attackers : int
+            squares of the attacking pieces
+        """
+        if occupied is None:
+            occupied = self.occupied
+        pawn, knight, bishop, rook, queen, king = self.bitboards[6 * color:6 * color + 6]
+        return (
+            PAWN_ATTACKS[1 - color][square] & pawn
+            | KNIGHT_ATTACKS[square] & knight
+            | KING_ATTACKS[square] & king
+            | bishop_attacks(square, occupied) & (bishop | queen)
+            | rook_attacks(square, occupied) & (rook | queen)
+        )
+
+    def legal_moves(self, captures=False):
+        """
+        all legal moves of the side to move
+
+        Checkers and pinned pieces are computed once up front, so no move
+        has to be played to test whether it leaves the king in check.
+
+        Parameters
+        ----------
+        captures : bool, optional
+            only generate captures and promotions, as needed by a
+            quiescence search
+
+        Returns
+        -------
+        moves : list
+            moves encoded as in ``bitboard.encode_move``, promotions are
+            listed once per piece to promote to
+        """
+        us = COLOR_INDEX[self._playing]
+        them = 1 - us
+        bitboards = self.bitboards
+        own = self.occupancy[us]
+        enemy = self.occupancy[them]
+        occupied = self.occupied
+        if not bitboards[6 * us + KING]:
+            # raises InvalidFEN for the missing king
+            self.king_position(self._playing)
+        king = lsb(bitboards[6 * us + KING])
+        checkers = self.attackers_to(king, them)
+        moves = []
+
+        # king moves, looking through the king for squares behind it on a checking ray
+        attacked = self.attacked[them]
+        wanted = enemy if captures else FULL
+        targets = KING_ATTACKS[king] & ~own & ~attacked & wanted
+        if checkers:
+            without_king = occupied ^ (1 << king)
+            for dest in iter_squares(targets):
+                if not self.attackers_to(dest, them, without_king):
+                    moves.append(king | dest << 6)
+        else:
+            for dest in iter_squares(targets):
+                moves.append(king | dest << 6)
+
+        if checkers & (checkers - 1):
+            # double check, only the king can move
+            return moves
+        if checkers:
+            evasions = checkers | BETWEEN[king][lsb(checkers)]
+        else:
+            evasions = FULL
+
+        # pinned pieces may only move along the line through the king and the pinner
+        pins = {}
+        snipers = (
+            rook_attacks(king, enemy) & (bitboards[6 * them + ROOK] | bitboards[6 * them + QUEEN])
+            | bishop_attacks(king, enemy)
+            & (bitboards[6 * them + BISHOP] | bitboards[6 * them + QUEEN])
+        )
+        for sniper in iter_squares(snipers):
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pins[lsb(blockers)] = LINE[king][sniper]
+
+        targets = ~own & evasions & wanted
+        pawn, knight, bishop, rook, queen = bitboards[6 * us:6 * us + 5]
+        for origin in iter_squares(knight):
+            if origin not in pins:
+                for dest in iter_squares(KNIGHT_ATTACKS[origin] & targets):
+                    moves.append(origin | dest << 6)
+        for origin in iter_squares(bishop | queen):
+            attacks = bishop_attacks(origin, occupied) & targets & pins.get(origin, FULL)
+            for dest in iter_squares(attacks):
+                moves.append(origin | dest << 6)
+        for origin in iter_squares(rook | queen):
+            attacks = rook_attacks(origin, occupied) & targets & pins.get(origin, FULL)
+            for dest in iter_squares(attacks):
+                moves.append(origin | dest << 6)
+
+        # pawn moves
+        step = 8 if us == 0 else -8
+        start_rank = 1 if us == 0 else 6
+        for origin in iter_squares(pawn):
+            allowed = evasions & pins.get(origin, FULL)
+            dests = PAWN_ATTACKS[us][origin] & enemy
+            push = origin + step
+            promoting = push < 8 or push > 55
+            if 0 <= push < 64 and not occupied >> push & 1 and (promoting or not captures):
+                dests |= 1 << push
+                if origin >> 3 == start_rank and not occupied >> (push + step) & 1:
+                    dests |= 1 << (push + step)
+            for dest in iter_squares(dests & allowed):
+                if dest < 8 or dest > 55:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(origin | dest << 6 | promotion << 12)
+                else:
+                    moves.append(origin | dest << 6)
+
+        # en passant, checked by removing both pawns from the board
+        ep = self.ep_square
+        if ep is not None:
+            captured = ep - step
+            if evasions >> ep & 1 or checkers >> captured & 1:
+                rooks = bitboards[6 * them + ROOK] | bitboards[6 * them + QUEEN]
+                bishops = bitboards[6 * them + BISHOP] | bitboards[6 * them + QUEEN]
+                for origin in iter_squares(PAWN_ATTACKS[them][ep] & pawn):
+                    after = occupied ^ (1 << origin) ^ (1 << captured) | 1 << ep
+                    if not (
+                            rook_attacks(king, after) & rooks
+                            or bishop_attacks(king, after) & bishops
+                    ):
+                        moves.append(origin | ep << 6)
+
+        # castling
+        home = 4 if us == 0 else 60
+        if not checkers and king == home and not captures:
+            rights = self.castling_rights >> (2 * us)
+            if (
+                    rights & 1 and rook >> (home + 3) & 1
+                    and not occupied & (3 << (home + 1))
+                    and not attacked & (3 << (home + 1))
+            ):
+                moves.append(home | (home + 2) << 6)
+            if (
+                    rights & 2 and rook >> (home - 4) & 1
+                    and not occupied & (7 << (home - 3))
+                    and not attacked & (3 << (home - 2))
+            ):
+                moves.append(home | (home - 2) << 6)
+        return moves
+
+    def make_move(self, move):
+        """
+        play a move on this board in place
+
+        The move must be encoded as in ``bitboard.encode_move`` and is
+        assumed to be pseudo-legal; side to move, castling rights, en passant
+        target square and the move clocks are updated as well.
+
+        Parameters
+        ----------
+        move : int
+            encoded move
+
+        Returns
+        -------
+        undo : Undo
+            record to pass to ``unmake_move`` to take the move back
+        """
+        origin = move_origin(move)
+        dest = move_destination(move)
+        piece = self._board[origin]
+        captured = self._board[dest]
+        undo = Undo(
+            move, captured, self.castling_rights, self.ep_square, self._halfmove_clock, None
+        )
+        white = piece.color == "w"
+
+        self.zobrist_key ^= ep_key(self)
+        self._relocate(origin, dest)
+        self.ep_square = None
+        if piece.piece_type == PAWN:
+            if dest == undo.enpassant:
+                # en passant capturing
+                enemy_square = dest - 8 if white else dest + 8
+                captured = self._board[enemy_square]
+                self._remove(enemy_square)
+                undo = undo._replace(captured=captured)
+            elif dest - origin in (16, -16):
+                self.ep_square = (origin + dest) // 2
+            elif dest < 8 or dest > 55:
+                letter = PROMOTION_LETTERS[move_promotion(move) or 4]
+                self._remove(dest)
+                abbr2piece(letter.upper() if white else letter).place_at(SQUARES[dest], self)
+                undo = undo._replace(promoted=piece)
+            self._halfmove_clock = 0
+        else:
+            if piece.piece_type == KING and dest - origin in (2, -2):
+                # castling, move the rook as well
+                if dest > origin:
+                    self._relocate(origin + 3, origin + 1)
+                else:
+                    self._relocate(origin - 4, origin - 1)
+            if captured is None:
+                self._halfmove_clock += 1
+            else:
+                self._halfmove_clock = 0
+
+        rights = self.castling_rights & CASTLING_MASKS[origin] & CASTLING_MASKS[dest]
+        self.zobrist_key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[rights] ^ TURN_KEY
+        self.castling_rights = rights
+        if not white:
+            self._fullmove_number += 1
+        self._playing = "b" if white else "w"
+        self.zobrist_key ^= ep_key(self)
+        self._fen = None
+
+        key = self.zobrist_key
+        if self._halfmove_clock:
+            self.repetitions[key] = self.repetitions.get(key, 0) + 1
+        else:
+            self._saved_repetitions.append(self.repetitions)
+            self.repetitions = {key: 1}
+        return undo
+
+    def unmake_move(self, undo):
+        """
+        take back a move played by ``make_move``
+
+        Parameters
+        ----------
+        undo : Undo
+            record returned by ``make_move``
+        """
+        origin = move_origin(undo.move)
+        dest = move_destination(undo.move)
+        piece = undo.promoted or self._board[dest]
+        white = piece.color == "w"
+        captured = undo.captured
+        enpassant = piece.piece_type == PAWN and dest == undo.enpassant
+
+        key = self.zobrist_key
+        if self._halfmove_clock:
+            count = self.repetitions.get(key, 1) - 1
+            if count:
+                self.repetitions[key] = count
+            else:
+                self.repetitions.pop(key, None)
+        else:
+            self.repetitions = self._saved_repetitions.pop() if self._saved_repetitions else {}
+        self.zobrist_key ^= ep_key(self)
+
+        if captured is None or enpassant:
+            self._remove(dest)
+        else:
+            self._remove(dest, update=False)
+            self._put(dest, captured, update=False)
+        self._put(origin, piece)
+
+        if enpassant:
+            capture_square = dest - 8 if white else dest + 8
+            self._put(capture_square, captured)
+        elif captured is None and piece.piece_type == KING and dest - origin in (2, -2):
+            if dest > origin:
+                self._relocate(origin + 1, origin + 3)
+            else:
+                self._relocate(origin - 1, origin - 4)
+
+        self.zobrist_key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[undo.castling]
+        self.zobrist_key ^= TURN_KEY
+        self.castling_rights = undo.castling
+        self.ep_square = undo.enpassant
+        self._halfmove_clock = undo.halfmove_clock
+        if not white:
+            self._fullmove_number -= 1
+        self._playing = piece.color
+        self.zobrist_key ^= ep_key(self)
+        self._fen = None
@@ -1,6 +1,10 @@
-from copy import deepcopy
+from bitboard import (
+    PROMOTION_LETTERS, SQUARES, move2uci, move_destination, move_origin, move_promotion
+)
 from board import Board
 from error import Check, InvalidMove, InvalidPiece, NotYourTurn
+from history import History
+from san import san2move
 
 
 class Chess(object):
@@ -14,28 +18,48 @@ class Chess(object):
         if fen is None:
             fen = self.initial_fen
         self.board = Board(fen)
-        self.history = []
+        self.history = History()
 
     def restart(self):
         self.board = Board(self.initial_fen)
-        self.history = []
+        self.history = History()
 
-    def incheck_after(self, origin, dest):
-        board_copy = deepcopy(self.board)
-        piece = board_copy[origin]
+    def legal_moves(self):
+        """
+        all legal moves of the player to move
+
+        Returns
+        -------
+        moves : list
+            moves in long algebraic notation, e.g. "e2e4" or "e7e8q"
+        """
+        return [move2uci(move) for move in self.board.legal_moves()]
+
+    def incheck_after(self, origin, dest, promotion=None):
+        piece = self.board[origin]
         color = piece.color
-        piece.move_to(dest)
-        king_pos = board_copy.king_position(color)
-        return king_pos in board_copy.attacked_squares(color)
+        undo = piece.move_to(self.board, origin, dest, promotion)
+        try:
+            return self.incheck(color)
+        finally:
+            self.board.unmake_move(undo)
 
     def incheck(self, color):
         king_pos = self.board.king_position(color)
-        return king_pos in self.board.attacked_squares(color)
+        return self.board.is_attacked(king_pos, "b" if color == "w" else "w")
 
     def isdraw(self):
-        pass
+        """
+        whether the game is drawn by stalemate, threefold repetition, the
+        fifty-move rule or insufficient material
+        """
+        return self.board.is_draw()
 
-    def move(self, origin, dest):
+    def result(self):
+        """ result of the game, "1-0", "0-1", "1/2-1/2" or "*" if it goes on """
+        return self.board.result()
+
+    def move(self, origin, dest, promotion=None):
         piece = self.board[origin]
 
         # if no piece at the origin, exit
@@ -48,35 +72,85 @@ class Chess(object):
             color = "white" if played == "w" else "black"
             raise NotYourTurn(f"It's not {color}'s turn")
 
-        if self.incheck_after(origin, dest):
+        # only legal moves reach the board, so it never has to be restored
+        moves = piece.possible_moves(self.board, origin)
+        if dest not in moves:
+            raise InvalidMove(f"{origin} cannot move to {dest}, possible moves are {moves}")
+        move = piece.encode_move(origin, dest, promotion)
+        if move not in self.board.legal_moves():
             raise InvalidMove("The king is under attack")
-
-        # update board
-        self.history.append(deepcopy(self.board))
-        piece.move_to(dest)
-
-        # update player turn
-        self.board.playing = "w" if piece.color == "b" else "b"
-
-        # update en passant target square
-        if piece.name != "Pawn":
-            self.board.enpassant_target = "-"
-
-        # update halfmove clock
-        if self.history[-1][dest] is None and piece.name != "Pawn":
-            self.board.halfmove_clock += 1
-        else:
-            self.board.halfmove_clock = 0
-
-        # update fullmove number
-        if piece.color == "b":
-            self.board.fullmove_number += 1
-
-        self.board.update_fen()
+        self.history.push(self.board.make_move(move))
 
         if self.incheck(self.board.playing):
             raise Check()
 
+    def move_san(self, san):
+        """
+        move a piece given a move in SAN, e.g. "Nf3", "exd5" or "e8=Q"
+
+        Raises the same errors as ``move``.
+        """
+        move = san2move(self.board, san)
+        promotion = move_promotion(move)
+        self.move(
+            SQUARES[move_origin(move)], SQUARES[move_destination(move)],
+            PROMOTION_LETTERS[promotion] if promotion else None
+        )
+
+    def book_moves(self, db):
+        """
+        moves played from the current position according to a position
+        database (positiondb.PositionDB), most played first
+
+        Returns
+        -------
+        entries : list
+            (move in long algebraic notation, positiondb.Entry) pairs
+        """
+        return [(move2uci(entry.move), entry) for entry in db.moves(self.board)]
+
+    def opening_move(self, book, rng=None):
+        """
+        move of a Polyglot opening book (polyglot.OpeningBook) for the
+        current position, picked at random in proportion to the weights
+
+        Returns
+        -------
+        move : str or None
+            move in long algebraic notation, None if the position is not
+            in the book
+        """
+        entry = book.choice(self.board, rng)
+        return None if entry is None else move2uci(entry.move)
+
+    def undo(self):
+        """ take back the last move """
+        if self.history.ply == 0:
+            raise InvalidMove("No move to undo")
+        self.history.undo(self.board)
+
+    def redo(self):
+        """ replay the last move taken back """
+        if self.history.ply == len(self.history):
+            raise InvalidMove("No move to redo")
+        self.history.redo(self.board)
+
+    def goto(self, ply):
+        """
+        move back or forward through the game
+
+        Parameters
+        ----------
+        ply : int
+            number of moves played from the initial position
+        """
+        if not 0 <= ply <= len(self.history):
+            raise InvalidMove(f"Ply must be between 0 and {len(self.history)}: {ply}")
+        while self.history.ply > ply:
+            self.history.undo(self.board)
+        while self.history.ply < ply:
+            self.history.redo(self.board)
+
 
 def main():
     Chess()
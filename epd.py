@@ -0,0 +1,244 @@
+"""
+streaming reader of FEN and EPD files
+
+Lines are parsed straight into ``Position`` tuples of piece bitboards and
+state, without creating a Board or any piece objects, and yielded one at
+a time so that files of any length are read in bounded memory.
+
+An EPD line has the four first fields of a FEN followed by operations,
+each an opcode and its operands ended by a semicolon, for example
+
+    r1b1kb1r/ppp2ppp/2n5/3q4/8/5N2/PPPP1PPP/RNBQKB1R w KQkq - bm Nc3; id "test 1";
+
+A line with six fields and no operations is read as a FEN. The hmvc and
+fmvn operations set the move clocks of an EPD position.
+"""
+
+import re
+from collections import namedtuple
+from bitboard import PIECE_LETTERS, SQUARE_INDEX, SQUARES, iter_squares
+from board import Board, CASTLING_LETTERS, CASTLING_STRINGS
+from error import InvalidFEN
+from packing import pack_position
+
+# expand the digits of a FEN rank into dots
+_EXPAND = str.maketrans({str(n): "." * n for n in range(1, 9)})
+# one translation per piece letter, to "1" for the letter and "0" otherwise
+_SELECT = [
+    str.maketrans({c: "1" if c == letter else "0" for c in PIECE_LETTERS + "."})
+    for letter in PIECE_LETTERS
+]
+_VALID = str.maketrans({c: None for c in PIECE_LETTERS + "."})
+# an opcode and its operands, the semicolon may be left out at the end
+_OPERATION = re.compile(
+    r'\s*([A-Za-z][A-Za-z0-9_]*)((?:\s+(?:"(?:[^"\\]|\\.)*"|[^\s;"]+))*)\s*(?:;|$)'
+)
+_OPERAND = re.compile(r'"((?:[^"\\]|\\.)*)"|([^\s;"]+)')
+_ESCAPE = re.compile(r'\\(.)')
+
+
+class Position(namedtuple("Position", [
+        "bitboards", "playing", "castling", "ep_square", "halfmove_clock",
+        "fullmove_number", "operations"])):
+    """
+    position read from a FEN or EPD line
+
+    bitboards : tuple of 12 bitboards indexed as ``bitboard.PIECE_LETTERS``
+    playing : "w" or "b"
+    castling : castling rights as bits in the order of "KQkq"
+    ep_square : en passant target square (a1 = 0), None if not available
+    halfmove_clock, fullmove_number : move clocks
+    operations : dict of EPD opcode to its list of operands
+    """
+
+    __slots__ = ()
+
+    @property
+    def bm(self):
+        """ best moves in SAN """
+        return self.operations.get("bm", [])
+
+    @property
+    def am(self):
+        """ moves to avoid in SAN """
+        return self.operations.get("am", [])
+
+    @property
+    def id(self):
+        operands = self.operations.get("id")
+        return operands[0] if operands else None
+
+    @property
+    def c0(self):
+        operands = self.operations.get("c0")
+        return operands[0] if operands else None
+
+    @property
+    def fen(self):
+        squares = ["."] * 64
+        for letter, bitboard in zip(PIECE_LETTERS, self.bitboards):
+            for square in iter_squares(bitboard):
+                squares[square] = letter
+        rows = []
+        for start in range(56, -1, -8):
+            row = "".join(squares[start:start + 8])
+            for n in range(8, 0, -1):
+                row = row.replace("." * n, str(n))
+            rows.append(row)
+        return " ".join([
+            "/".join(rows),
+            self.playing,
+            CASTLING_STRINGS[self.castling],
+            "-" if self.ep_square is None else SQUARES[self.ep_square],
+            str(self.halfmove_clock),
+            str(self.fullmove_number),
+        ])
+
+    def board(self):
+        """ Board of this position """
+        return Board.from_bitboards(*self[:6])
+
+    def to_bytes(self):
+        """ position in the 32-byte encoding of ``packing`` """
+        return pack_position(*self[:6])
+
+
+def parse_placement(placement):
+    """
+    bitboards of a FEN piece placement
+
+    Returns
+    -------
+    bitboards : tuple
+        12 bitboards indexed as ``bitboard.PIECE_LETTERS``
+    """
+    rows = placement.split("/")
+    if len(rows) != 8:
+        raise InvalidFEN("There must be eight ranks")
+    # squares from h8 down to a1, so that the first character is the
+    # highest bit of the bitboards read with int(..., 2)
+    expanded = []
+    for row in rows:
+        row = row.translate(_EXPAND)
+        if len(row) != 8:
+            raise InvalidFEN("Rank must have eight locations")
+        expanded.append(row[::-1])
+    squares = "".join(expanded)
+    if squares.translate(_VALID):
+        raise InvalidFEN(f"Unknown piece in placement: {placement}")
+    return tuple(int(squares.translate(select), 2) for select in _SELECT)
+
+
+def parse_operations(text):
+    """
+    EPD operations as a dict of opcode to list of operands
+
+    Quoted operands are unquoted with backslash escapes resolved, unquoted
+    ones are split on whitespace.
+    """
+    operations = {}
+    end = 0
+    text = text.rstrip()
+    while end < len(text):
+        if text[end] in " \t;":
+            # empty operation
+            end += 1
+            continue
+        match = _OPERATION.match(text, end)
+        if match is None:
+            raise InvalidFEN(f"Invalid EPD operation: {text[end:].strip()}")
+        operations[match.group(1)] = [
+            _ESCAPE.sub(r"\1", quoted) if unquoted is None else unquoted
+            for quoted, unquoted in (m.groups() for m in _OPERAND.finditer(match.group(2)))
+        ]
+        end = match.end()
+    return operations
+
+
+def parse_line(line):
+    """
+    parse a FEN or EPD line
+
+    Parameters
+    ----------
+    line : str
+        FEN, or EPD with or without operations
+
+    Returns
+    -------
+    position : Position
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise InvalidFEN("EPD must consist of at least 4 fields")
+    placement, playing, castling, ep = fields[:4]
+    bitboards = parse_placement(placement)
+    if playing not in ("w", "b"):
+        raise InvalidFEN(f"Unknown player: {playing}")
+
+    rights = 0
+    if castling != "-":
+        for letter in castling:
+            i = CASTLING_LETTERS.find(letter)
+            if i < 0:
+                raise InvalidFEN(f"Unknown castling availability: {castling}")
+            rights |= 1 << i
+    if ep == "-":
+        ep_square = None
+    elif ep in SQUARE_INDEX:
+        ep_square = SQUARE_INDEX[ep]
+    else:
+        raise InvalidFEN("Unrecognizable en passant target square")
+
+    halfmove_clock = 0
+    fullmove_number = 1
+    operations = {}
+    rest = fields[4] if len(fields) > 4 else ""
+    clocks = rest.split()
+    if len(clocks) == 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        halfmove_clock = int(clocks[0])
+        fullmove_number = int(clocks[1])
+    elif rest:
+        operations = parse_operations(rest)
+        try:
+            if "hmvc" in operations:
+                halfmove_clock = int(operations["hmvc"][0])
+            if "fmvn" in operations:
+                fullmove_number = int(operations["fmvn"][0])
+        except (IndexError, ValueError):
+            raise InvalidFEN("Unknown move clock") from None
+    return Position(
+        bitboards, playing, rights, ep_square, halfmove_clock, fullmove_number, operations
+    )
+
+
+def read_positions(source, skip_invalid=False):
+    """
+    read positions from a FEN or EPD file one line at a time
+
+    Blank lines and comment lines starting with "#" or "%" are skipped.
+
+    Parameters
+    ----------
+    source : str or file object
+        path of the file or an open text file
+    skip_invalid : bool, optional
+        skip lines that cannot be parsed instead of raising InvalidFEN
+
+    Yields
+    ------
+    position : Position
+    """
+    if isinstance(source, str):
+        with open(source) as f:
+            yield from read_positions(f, skip_invalid)
+        return
+    for number, line in enumerate(source, 1):
+        line = line.strip()
+        if not line or line[0] in "#%":
+            continue
+        try:
+            yield parse_line(line)
+        except InvalidFEN as e:
+            if not skip_invalid:
+                raise InvalidFEN(f"line {number}: {e}") from None
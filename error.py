@@ -28,3 +28,7 @@ class InvalidPiece(ChessError):
 
 class NotYourTurn(ChessError):
     pass
+
+
+class DatabaseError(ChessError):
+    pass
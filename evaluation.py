@@ -0,0 +1,114 @@
+"""
+static evaluation of board positions
+
+Material plus piece-square tables from the "Simplified Evaluation
+Function" by Tomasz Michniewski, in centipawns.
+"""
+
+from bitboard import iter_squares
+
+# pawn, knight, bishop, rook, queen, king
+PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+
+# from white's point of view, rank 8 first so that they read like a board
+PIECE_SQUARE_TABLES = [
+    [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+]
+
+
+def _square_scores():
+    # material plus table bonus for each piece index and square (a1 = 0),
+    # positive for white and negative for black
+    scores = []
+    for color, sign in [(0, 1), (1, -1)]:
+        for piece_type in range(6):
+            table = PIECE_SQUARE_TABLES[piece_type]
+            scores.append([
+                sign * (PIECE_VALUES[piece_type] + table[square ^ (56 if color == 0 else 0)])
+                for square in range(64)
+            ])
+    return scores
+
+
+SQUARE_SCORES = _square_scores()
+
+
+def evaluate(board):
+    """
+    evaluate a position
+
+    Parameters
+    ----------
+    board : Board
+        position to evaluate
+
+    Returns
+    -------
+    score : int
+        score in centipawns from the point of view of the side to move
+    """
+    score = 0
+    for index, bitboard in enumerate(board.bitboards):
+        table = SQUARE_SCORES[index]
+        for square in iter_squares(bitboard):
+            score += table[square]
+    return score if board.playing == "w" else -score
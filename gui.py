@@ -1,14 +1,20 @@
 import tkinter as tk
+from collections import OrderedDict
 from PIL import Image, ImageTk
+from analysis import format_score
 from error import Check, InvalidMove, InvalidPiece, NotYourTurn
+from san import move2san
 
 
 class GUI(tk.Frame):
 
     rows = 8
     columns = 8
-    original_img_size = (100, 100)
-    icon_size = (32, 32)
+    # side of the piece icons relative to the square length
+    icon_scale = 0.8
+    # rendered icons kept, more than the 12 pieces on 3 backgrounds of a
+    # single size so that a resize does not evict what is on the board
+    icon_cache_size = 72
     files = ["a", "b", "c", "d", "e", "f", "g", "h"]
     ranks = ["8", "7", "6", "5", "4", "3", "2", "1"]
     light_color = "#FFDEAD"
@@ -28,9 +34,19 @@ class GUI(tk.Frame):
         "P": "img/white_pawn.png"
     }
 
-    def __init__(self, master, chess, square_length=64):
+    # book moves shown in the status bar
+    book_shown = 3
+    # milliseconds between two reads of the analysis updates
+    analysis_interval = 100
+
+    def __init__(self, master, chess, square_length=64, book=None, analysis=None):
         super().__init__(master)
         self.chess = chess
+        self.book = book
+        self.analysis = analysis
+        # positions the book moves and the analysis were last shown for
+        self.book_key = None
+        self.analyzed_key = None
         self.square_length = square_length
         self.selected = None
         self.highlighted = [
@@ -46,6 +62,15 @@ class GUI(tk.Frame):
         self.canvas.bind("<Button-1>", self.click)
         self.canvas.pack(side="top", fill="both", anchor="c", expand=True)
 
+        # canvas items of each square, indexed by row * columns + col, the
+        # fill color, piece and icon size they show and the icons shown,
+        # which must stay referenced even if evicted from the icon cache
+        self.square_items = []
+        self.piece_items = []
+        self.drawn = [None] * (self.rows * self.columns)
+        self.shown_icons = [None] * (self.rows * self.columns)
+        self.create_items()
+
         self.statusbar = tk.Frame(self, height=64)
 
         self.button_quit = tk.Button(self, text="Quit", fg="black", command=self.master.destroy)
@@ -54,90 +79,183 @@ class GUI(tk.Frame):
         self.button_reset = tk.Button(self, text="Restart", fg="black", command=self.restart)
         self.button_reset.pack(side=tk.RIGHT, in_=self.statusbar)
 
+        self.button_redo = tk.Button(self, text=">", fg="black", command=self.redo)
+        self.button_redo.pack(side=tk.RIGHT, in_=self.statusbar)
+
+        self.button_undo = tk.Button(self, text="<", fg="black", command=self.undo)
+        self.button_undo.pack(side=tk.RIGHT, in_=self.statusbar)
+
+        self.master.bind("<Left>", self.undo)
+        self.master.bind("<Right>", self.redo)
+
         self.label_status = tk.Label(self.statusbar, text="White's turn", fg="black")
         self.label_status.pack(side=tk.LEFT, expand=0, in_=self.statusbar)
 
+        self.label_book = tk.Label(self.statusbar, text="", fg="black")
+        if book is not None:
+            self.label_book.pack(side=tk.LEFT, expand=0, in_=self.statusbar)
+
+        self.label_analysis = tk.Label(self.statusbar, text="", fg="black")
+        if analysis is not None:
+            self.label_analysis.pack(side=tk.LEFT, expand=0, in_=self.statusbar)
+            self.after(self.analysis_interval, self.poll_analysis)
+
         self.statusbar.pack(expand=False, fill="x", side='bottom')
 
-        # create icons
-        light_bg = Image.new("RGBA", self.original_img_size, self.light_color)
-        dark_bg = Image.new("RGBA", self.original_img_size, self.dark_color)
-        highlight_bg = Image.new("RGBA", self.original_img_size, "yellow")
-        self.icons = {}
-        for key, path in self.icon_path.items():
-            img = Image.open(path)
-            light_img = Image.alpha_composite(light_bg, img)
-            light_img = light_img.resize(self.icon_size).convert("RGB")
-            self.icons[self.light_color + key] = ImageTk.PhotoImage(light_img)
-            dark_img = Image.alpha_composite(dark_bg, img)
-            dark_img = dark_img.resize(self.icon_size).convert("RGB")
-            self.icons[self.dark_color + key] = ImageTk.PhotoImage(dark_img)
-            highlight_img = Image.alpha_composite(highlight_bg, img)
-            highlight_img = highlight_img.resize(self.icon_size).convert("RGB")
-            self.icons["yellow" + key] = ImageTk.PhotoImage(highlight_img)
+        # icons are rendered when first shown, see icon()
+        self.piece_images = {}
+        self.icons = OrderedDict()
 
     def coords2notation(self, row, col):
         return self.files[col] + self.ranks[row]
 
+    def icon(self, abbreviation, background, size):
+        """
+        image of a piece on a square color at a size, rendered on first use
+        and kept in a least recently used cache
+        """
+        key = (abbreviation, background, size)
+        icon = self.icons.get(key)
+        if icon is not None:
+            self.icons.move_to_end(key)
+            return icon
+
+        image = self.piece_images.get(abbreviation)
+        if image is None:
+            image = Image.open(self.icon_path[abbreviation]).convert("RGBA")
+            self.piece_images[abbreviation] = image
+        image = Image.alpha_composite(Image.new("RGBA", image.size, background), image)
+        icon = ImageTk.PhotoImage(image.resize((size, size)).convert("RGB"))
+        self.icons[key] = icon
+        if len(self.icons) > self.icon_cache_size:
+            self.icons.popitem(last=False)
+        return icon
+
+    def square_color(self, row, col):
+        # the color of the top left square is light
+        return self.light_color if (row + col) % 2 == 0 else self.dark_color
+
+    def square_coords(self, row, col):
+        # coordinates of top left and bottom right of a square
+        x1 = col * self.square_length
+        y1 = row * self.square_length
+        return x1, y1, x1 + self.square_length, y1 + self.square_length
+
+    def create_items(self):
+        """
+        create the canvas items of the squares and pieces once, they are
+        only updated afterwards
+        """
+        for row in range(self.rows):
+            for col in range(self.columns):
+                x1, y1, x2, y2 = self.square_coords(row, col)
+                self.square_items.append(self.canvas.create_rectangle(
+                    x1, y1, x2, y2,
+                    outline="black", fill=self.square_color(row, col), tags="square"
+                ))
+                self.piece_items.append(self.canvas.create_image(
+                    ((x1 + x2) // 2, (y1 + y2) // 2), state=tk.HIDDEN, tags="piece"
+                ))
+
+    def place_items(self):
+        """
+        move the canvas items to the squares after the square length has changed
+        """
+        for row in range(self.rows):
+            for col in range(self.columns):
+                index = row * self.columns + col
+                x1, y1, x2, y2 = self.square_coords(row, col)
+                self.canvas.coords(self.square_items[index], x1, y1, x2, y2)
+                self.canvas.coords(self.piece_items[index], (x1 + x2) // 2, (y1 + y2) // 2)
+
     def refresh(self, event=None):
         """
-        redraw board
+        redraw the squares whose piece or highlight has changed
         """
 
         if event:
             xsize = int((event.width - 1) / self.columns)
             ysize = int((event.height - 1) / self.rows)
-            self.square_length = min(xsize, ysize)
-
-        # delete the previous images
-        self.canvas.delete("square")
-        self.canvas.delete("piece")
+            square_length = min(xsize, ysize)
+            if square_length != self.square_length:
+                self.square_length = square_length
+                self.place_items()
 
-        # draw board
-        # the color of the top left square is light
-        color = self.light_color
+        icon_size = max(int(self.square_length * self.icon_scale), 1)
         for row in range(self.rows):
-            # exchange square color
-            if color == self.dark_color:
-                color = self.light_color
-            else:
-                color = self.dark_color
-
             for col in range(self.columns):
-                # exchange square color
-                if color == self.dark_color:
-                    color = self.light_color
+                index = row * self.columns + col
+                if self.highlighted[row][col]:
+                    fill = "yellow"
                 else:
-                    color = self.dark_color
-
-                # define coordinates of top left and bottom right of a square
-                x1 = col * self.square_length
-                x2 = x1 + self.square_length
-                y1 = row * self.square_length
-                y2 = y1 + self.square_length
+                    fill = self.square_color(row, col)
+                piece = self.chess.board[self.coords2notation(row, col)]
+                if piece is None:
+                    drawn = (fill, None, None)
+                else:
+                    drawn = (fill, repr(piece), icon_size)
+                if self.drawn[index] == drawn:
+                    continue
+                previous = self.drawn[index]
+                self.drawn[index] = drawn
 
-                # draw a light or dark square
-                if self.highlighted[row][col]:
-                    self.canvas.create_rectangle(
-                        x1, y1, x2, y2,
-                        outline="black", fill="yellow", tags="square"
-                    )
-                    filled_color = "yellow"
+                if previous is None or previous[0] != fill:
+                    self.canvas.itemconfigure(self.square_items[index], fill=fill)
+                if piece is None:
+                    self.canvas.itemconfigure(self.piece_items[index], state=tk.HIDDEN)
+                    self.shown_icons[index] = None
                 else:
-                    self.canvas.create_rectangle(
-                        x1, y1, x2, y2,
-                        outline="black", fill=color, tags="square"
+                    icon = self.icon(repr(piece), fill, icon_size)
+                    self.canvas.itemconfigure(
+                        self.piece_items[index], image=icon, state=tk.NORMAL
                     )
-                    filled_color = color
+                    self.shown_icons[index] = icon
 
-                # draw a piece
-                piece = self.chess.board[self.coords2notation(row, col)]
-                if piece is not None:
-                    self.canvas.create_image(
-                        ((x1 + x2) // 2, (y1 + y2) // 2),
-                        image=self.icons[filled_color + repr(piece)],
-                        tags=(repr(piece), "piece")
-                    )
+        self.show_book()
+        self.analyze()
+
+    def analyze(self):
+        """
+        hand the current position to the background analysis if it has
+        changed, which cancels the analysis of the previous one
+        """
+        if self.analysis is None:
+            return
+        board = self.chess.board
+        if board.zobrist_key == self.analyzed_key:
+            return
+        self.analyzed_key = board.zobrist_key
+        self.analysis.analyze(board)
+        self.label_analysis["text"] = "analyzing..."
+
+    def poll_analysis(self):
+        """
+        show the latest analysis update, called from the Tk event loop
+        """
+        updates = self.analysis.poll()
+        if updates:
+            update = updates[-1]
+            self.label_analysis["text"] = (
+                f"{format_score(update.score)} depth {update.depth}"
+                f"{'' if update.done else '+'}: {' '.join(update.pv[:4])}"
+            )
+        self.after(self.analysis_interval, self.poll_analysis)
+
+    def show_book(self):
+        """
+        show the most played moves of the current position in the book, if
+        it has changed
+        """
+        if self.book is None:
+            return
+        board = self.chess.board
+        if board.zobrist_key == self.book_key:
+            return
+        self.book_key = board.zobrist_key
+        entries = self.chess.book_moves(self.book)[:self.book_shown]
+        self.label_book["text"] = "  ".join(
+            f"{move2san(board, entry.move)} ({entry.games})" for _, entry in entries
+        )
 
     def click(self, event):
         # selected square
@@ -158,7 +276,9 @@ class GUI(tk.Frame):
                 self.selected = None
                 self.label_status["text"] = err.__class__.__name__
             except (InvalidPiece, NotYourTurn, InvalidMove) as err:
-                self.highlighted[self.selected[0]][self.selected[1]] = False
+                self.highlighted = [
+                    [False for _ in range(self.columns)] for _ in range(self.rows)
+                ]
                 self.selected = None
                 self.label_status["text"] = err.__class__.__name__
             else:
@@ -184,6 +304,13 @@ class GUI(tk.Frame):
             self.highlighted[row][col] = True
             self.selected = (row, col)
 
+            # highlight legal destinations of the selected piece
+            for move in self.chess.legal_moves():
+                if move[:2] == notation:
+                    dest_col = self.files.index(move[2])
+                    dest_row = self.ranks.index(move[3])
+                    self.highlighted[dest_row][dest_col] = True
+
     def move(self, origin, destination):
         if isinstance(origin, tuple):
             origin = self.coords2notation(*origin)
@@ -199,3 +326,30 @@ class GUI(tk.Frame):
         ]
         self.label_status["text"] = "White's turn"
         self.refresh()
+
+    def undo(self, event=None):
+        try:
+            self.chess.undo()
+        except InvalidMove as err:
+            self.label_status["text"] = str(err)
+        else:
+            self.show_position()
+
+    def redo(self, event=None):
+        try:
+            self.chess.redo()
+        except InvalidMove as err:
+            self.label_status["text"] = str(err)
+        else:
+            self.show_position()
+
+    def show_position(self):
+        self.selected = None
+        self.highlighted = [
+            [False for _ in range(self.columns)] for _ in range(self.rows)
+        ]
+        if self.chess.board.playing == "w":
+            self.label_status["text"] = "White's turn"
+        else:
+            self.label_status["text"] = "Black's turn"
+        self.refresh()
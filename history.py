@@ -0,0 +1,86 @@
+from array import array
+from bitboard import PIECE_LETTERS
+from board import Undo
+from piece import abbr2piece
+
+
+# layout of a history record (bit offset, width)
+# move : 0, 15
+# captured piece index + 1 (0 if no capture) : 15, 4
+# castling rights : 19, 4
+# file of en passant target + 1 (0 if not available) : 23, 4
+# promotion flag : 27, 1
+# halfmove clock : 28, 36
+
+
+def pack_undo(undo):
+    record = undo.move
+    if undo.captured is not None:
+        record |= (undo.captured.index + 1) << 15
+    record |= undo.castling << 19
+    if undo.enpassant is not None:
+        record |= ((undo.enpassant & 7) + 1) << 23
+    if undo.promoted is not None:
+        record |= 1 << 27
+    return record | undo.halfmove_clock << 28
+
+
+def unpack_undo(record, board):
+    """
+    rebuild an undo record for the last move played on the board
+
+    Pieces that left the board are looked up from their abbreviation.
+    """
+    move = record & 0x7FFF
+    moved_color = "b" if board.playing == "w" else "w"
+
+    captured = None
+    index = record >> 15 & 15
+    if index:
+        captured = abbr2piece(PIECE_LETTERS[index - 1])
+
+    enpassant = None
+    file = record >> 23 & 15
+    if file:
+        enpassant = file - 1 + (40 if moved_color == "w" else 16)
+
+    promoted = None
+    if record >> 27 & 1:
+        promoted = abbr2piece("P" if moved_color == "w" else "p")
+
+    return Undo(move, captured, record >> 19 & 15, enpassant, record >> 28, promoted)
+
+
+class History(object):
+    """
+    compact move log of a game
+
+    Each ply is stored as a single 64-bit integer holding the encoded move
+    and what is needed to take it back. Moves taken back are kept after the
+    current ply so that they can be replayed until a new move is pushed.
+    """
+
+    def __init__(self):
+        self._records = array("Q")
+        self.ply = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, ply):
+        return self._records[ply] & 0x7FFF
+
+    def push(self, undo):
+        del self._records[self.ply:]
+        self._records.append(pack_undo(undo))
+        self.ply += 1
+
+    def undo(self, board):
+        """ take back the last move played on the board """
+        self.ply -= 1
+        board.unmake_move(unpack_undo(self._records[self.ply], board))
+
+    def redo(self, board):
+        """ replay the next move taken back from the board """
+        board.make_move(self._records[self.ply] & 0x7FFF)
+        self.ply += 1
@@ -0,0 +1,159 @@
+"""
+load test of the game server
+
+Opens many connections to a running server, each playing random games
+against itself (it creates a game and joins it as the other color), and
+reports the moves played per second and the latency of the move
+requests.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+
+class Refused(Exception):
+    """ error response of the server to a request """
+
+
+class Client(object):
+    """ connection to the game server sending one request at a time """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._ids = 0
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=1 << 20)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        return cls(reader, writer)
+
+    async def request(self, op, **fields):
+        """ send a request and wait for its response, raising if it is refused """
+        self._ids += 1
+        fields["op"] = op
+        fields["id"] = self._ids
+        self.writer.write(json.dumps(fields).encode() + b"\n")
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise Refused(f"{op} refused: {response['error']['message']}")
+        return response
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def _play_game(client, deadline, max_plies, latencies, rng):
+    # play a random game, resigning it if still going after max_plies or
+    # at the deadline
+    created = await client.request("create")
+    joined = await client.request("join", game=created["game"])
+    tokens = {created["color"]: created["token"], joined["color"]: joined["token"]}
+    state = joined
+    for _ in range(max_plies):
+        if state["result"] != "*" or time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        state = await client.request(
+            "move", game=created["game"], token=tokens[state["turn"]],
+            move=rng.choice(state["legal_moves"])
+        )
+        latencies.append(time.perf_counter() - start)
+    if state["result"] == "*":
+        await client.request("resign", game=created["game"], token=tokens[state["turn"]])
+
+
+async def _play(client, deadline, max_plies, latencies, errors, rng):
+    # play random games until the deadline, return the number of games
+    games = 0
+    while time.perf_counter() < deadline:
+        try:
+            await _play_game(client, deadline, max_plies, latencies, rng)
+        except Refused as e:
+            # a refused request ends its game, not the load test
+            errors.append(str(e))
+        else:
+            games += 1
+    return games
+
+
+def percentile(values, fraction):
+    """ value below which the given fraction of sorted values lies """
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+async def run(host, port, path, connections, seconds, max_plies, seed=None):
+    """
+    play games on many connections at once for a while
+
+    Returns
+    -------
+    report : dict
+        moves, games, refused requests, moves per second and latency
+        percentiles in milliseconds
+    """
+    clients = await asyncio.gather(*(
+        Client.connect(host, port, path) for _ in range(connections)
+    ))
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    rng = random.Random(seed)
+    try:
+        games = await asyncio.gather(*(
+            _play(client, deadline, max_plies, latencies, errors, random.Random(rng.random()))
+            for client in clients
+        ))
+    finally:
+        await asyncio.gather(*(client.close() for client in clients))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "connections": connections,
+        "seconds": round(elapsed, 3),
+        "games": sum(games),
+        "moves": len(latencies),
+        "errors": len(errors),
+        "moves_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(1000 * percentile(latencies, 0.50), 3),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 3),
+        "max_ms": round(1000 * latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test a running game server")
+    parser.add_argument("--host", default="127.0.0.1", help="address of the server")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port of the server")
+    parser.add_argument("--unix", help="Unix socket of the server instead of TCP")
+    parser.add_argument("--connections", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of the test")
+    parser.add_argument("--max-plies", type=int, default=200, help="moves before resigning")
+    parser.add_argument("--seed", type=int, help="seed of the random moves")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(
+        args.host, args.port, args.unix, args.connections, args.seconds, args.max_plies,
+        args.seed
+    ))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,34 @@
+import argparse
 import tkinter as tk
+from analysis import AnalysisWorker
 from gui import GUI
 from chess import Chess
+from positiondb import PositionDB
 
 
 def main():
+    parser = argparse.ArgumentParser(description="play chess")
+    parser.add_argument("--book", help="position database to show book moves from")
+    parser.add_argument(
+        "--analyze", action="store_true", help="analyze the position in the background"
+    )
+    args = parser.parse_args()
+
     chess = Chess()
+    book = None if args.book is None else PositionDB(args.book)
+    analysis = AnalysisWorker() if args.analyze else None
 
     root = tk.Tk()
     root.title("Chess")
-    gui = GUI(root, chess)
+    gui = GUI(root, chess, book=book, analysis=analysis)
     gui.pack()
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        if book is not None:
+            book.close()
+        if analysis is not None:
+            analysis.close()
 
 
 if __name__ == '__main__':
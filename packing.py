@@ -0,0 +1,164 @@
+"""
+compact binary encoding of positions and moves
+
+A position packs into POSITION_SIZE (32) bytes, little endian:
+
+    bytes  0-7   occupied squares bitboard
+    bytes  8-23  piece index (bitboard.PIECE_LETTERS) of each occupied
+                 square from a1 upwards, one nibble each, low nibble first
+    byte   24    side to move (bit 0, set for black), castling rights
+                 (bits 1-4, "KQkq")
+    byte   25    en passant target square + 1, 0 if not available
+    bytes 26-27  halfmove clock
+    bytes 28-29  fullmove number
+    bytes 30-31  zero
+
+A move is the 16-bit integer of ``bitboard.encode_move``. Arrays of
+either are simply their encodings back to back, so they can be written
+to disk, memory mapped and sent between processes as plain bytes.
+"""
+
+import struct
+import sys
+from array import array
+from bitboard import iter_squares
+from error import InvalidFEN
+
+POSITION_FORMAT = struct.Struct("<Q16sBBHH2x")
+POSITION_SIZE = POSITION_FORMAT.size
+MAX_PIECES = 32
+
+
+def pack_position(bitboards, playing, castling, ep_square, halfmove_clock, fullmove_number):
+    """
+    encode a position
+
+    Parameters
+    ----------
+    bitboards : sequence
+        12 piece bitboards indexed as ``bitboard.PIECE_LETTERS``
+    playing : str
+        "w" or "b"
+    castling : int
+        castling rights as bits in the order of "KQkq"
+    ep_square : int or None
+        en passant target square
+    halfmove_clock, fullmove_number : int
+        move clocks
+
+    Returns
+    -------
+    data : bytes
+        POSITION_SIZE bytes
+    """
+    indices = [0] * 64
+    occupied = 0
+    for index, bitboard in enumerate(bitboards):
+        occupied |= bitboard
+        for square in iter_squares(bitboard):
+            indices[square] = index
+    pieces = [indices[square] for square in iter_squares(occupied)]
+    if len(pieces) > MAX_PIECES:
+        raise InvalidFEN(f"Cannot pack more than {MAX_PIECES} pieces")
+    pieces.extend([0] * (MAX_PIECES - len(pieces)))
+    nibbles = bytes(pieces[i] | pieces[i + 1] << 4 for i in range(0, MAX_PIECES, 2))
+    try:
+        return POSITION_FORMAT.pack(
+            occupied, nibbles, (playing == "b") | castling << 1,
+            0 if ep_square is None else ep_square + 1, halfmove_clock, fullmove_number
+        )
+    except struct.error:
+        raise InvalidFEN("Move clocks are out of range to pack") from None
+
+
+def unpack_position(data, offset=0):
+    """
+    decode a position packed by ``pack_position``
+
+    Returns
+    -------
+    fields : tuple
+        bitboards (list of 12), playing, castling, ep_square,
+        halfmove_clock and fullmove_number
+    """
+    try:
+        occupied, nibbles, flags, ep, halfmove_clock, fullmove_number = (
+            POSITION_FORMAT.unpack_from(data, offset)
+        )
+    except struct.error:
+        raise InvalidFEN(f"Packed position must be {POSITION_SIZE} bytes") from None
+    bitboards = [0] * 12
+    for i, square in enumerate(iter_squares(occupied)):
+        index = nibbles[i >> 1] >> 4 * (i & 1) & 15
+        if index > 11:
+            raise InvalidFEN(f"Unknown piece index in packed position: {index}")
+        bitboards[index] |= 1 << square
+    return (
+        bitboards, "b" if flags & 1 else "w", flags >> 1 & 15,
+        ep - 1 if ep else None, halfmove_clock, fullmove_number
+    )
+
+
+def pack_positions(boards):
+    """
+    encodings of many boards back to back
+
+    Anything with a ``to_bytes`` method packing it as a position, such as
+    Board or epd.Position, can be given.
+    """
+    return b"".join(board.to_bytes() for board in boards)
+
+
+def iter_positions(data):
+    """ fields of each position of packed positions back to back """
+    if len(data) % POSITION_SIZE:
+        raise InvalidFEN(f"Packed positions must be a multiple of {POSITION_SIZE} bytes")
+    for offset in range(0, len(data), POSITION_SIZE):
+        yield unpack_position(data, offset)
+
+
+def write_positions(f, boards, batch_size=4096):
+    """
+    write boards or epd positions to a binary file in batches
+
+    Returns
+    -------
+    count : int
+        number of positions written
+    """
+    count = 0
+    batch = []
+    for board in boards:
+        batch.append(board.to_bytes())
+        if len(batch) == batch_size:
+            f.write(b"".join(batch))
+            count += len(batch)
+            batch = []
+    f.write(b"".join(batch))
+    return count + len(batch)
+
+
+def read_positions(f, batch_size=4096):
+    """ fields of each position of a binary file written by ``write_positions`` """
+    while True:
+        data = f.read(POSITION_SIZE * batch_size)
+        if not data:
+            return
+        yield from iter_positions(data)
+
+
+def pack_moves(moves):
+    """ 16-bit encodings of moves back to back, little endian """
+    moves = array("H", moves)
+    if sys.byteorder == "big":
+        moves.byteswap()
+    return moves.tobytes()
+
+
+def unpack_moves(data):
+    """ moves of ``pack_moves`` """
+    moves = array("H")
+    moves.frombytes(data)
+    if sys.byteorder == "big":
+        moves.byteswap()
+    return moves.tolist()
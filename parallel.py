@@ -0,0 +1,188 @@
+"""
+lazy SMP: one search spread over several processes
+
+Every worker process searches the same position with its own Searcher,
+and all of them read and write a single transposition table in
+``multiprocessing.shared_memory`` (see ``transposition`` for how entries
+stay consistent without locks). Helpers order the root moves differently
+and odd helpers search one ply deeper, so they fill the table with
+positions the main search reaches later and it completes deeper
+iterations in the same time. The move of the main search is returned,
+with the nodes of all workers.
+
+With a single worker the search runs in the calling process on a private
+table, and gives the same result as ``search.search`` every time.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Event
+from multiprocessing.shared_memory import SharedMemory
+from bitboard import move2uci
+from board import Board
+from chess import Chess
+from search import Searcher, SearchResult
+from transposition import BUCKET_SIZE, ENTRY_BYTES, TranspositionTable
+
+# per-process state of the workers, set up by _init_worker
+_worker = {}
+
+
+class _Helper(Searcher):
+    """ searcher of a helper process, looking at the root moves in another order """
+
+    def __init__(self, board, helper, **options):
+        super().__init__(board, **options)
+        self.helper = helper
+
+    def root(self, moves, depth, pv):
+        return super().root(moves, depth + self.helper % 2, pv)
+
+    def order(self, moves, best, ply):
+        moves = super().order(moves, best, ply)
+        if ply > 0 or len(moves) < 3:
+            return moves
+        # keep the best move first and rotate the others
+        shift = self.helper % (len(moves) - 1)
+        return moves[:1] + moves[1 + shift:] + moves[1:1 + shift]
+
+
+def _init_worker(name, stop):
+    _worker["memory"] = SharedMemory(name)
+    _worker["table"] = TranspositionTable(buffer=_worker["memory"].buf)
+    _worker["stop"] = stop
+
+
+def _search(data, worker, options):
+    board = Board.from_bytes(data)
+    table = _worker["table"]
+    stop = _worker["stop"]
+    if worker == 0:
+        searcher = Searcher(board, stop=stop, table=table, **options)
+    else:
+        searcher = _Helper(board, worker, stop=stop, table=table, **options)
+    return searcher.search()
+
+
+class ParallelSearch(object):
+    """
+    search pool keeping its processes and shared table between searches
+
+    Parameters
+    ----------
+    workers : int, optional
+        number of processes searching, the number of CPUs by default;
+        with 1 worker no process is started
+    size_mb : float, optional
+        size of the shared transposition table in megabytes
+    """
+
+    def __init__(self, workers=None, size_mb=64):
+        self.workers = os.cpu_count() if workers is None else max(workers, 1)
+        self._memory = None
+        self._pool = None
+        if self.workers == 1:
+            self.table = TranspositionTable(size_mb)
+            return
+        buckets = int(size_mb * (1 << 20)) // (ENTRY_BYTES * BUCKET_SIZE)
+        if buckets < 1:
+            raise ValueError("size_mb is too small for a single bucket")
+        size = ENTRY_BYTES * BUCKET_SIZE * (1 << (buckets.bit_length() - 1))
+        self._memory = SharedMemory(create=True, size=size)
+        self.table = TranspositionTable(buffer=self._memory.buf)
+        self._stop = Event()
+        self._pool = ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=(self._memory.name, self._stop)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ stop the worker processes and free the shared table """
+        if self._pool is not None:
+            self._stop.set()
+            self._pool.shutdown()
+            self._pool = None
+        if self._memory is not None:
+            self.table.release()
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def search(self, board, max_depth=None, time_limit=None, node_limit=None, book=None):
+        """
+        search for the best move of a board
+
+        The limits apply to every worker on its own. See ``search.Searcher``
+        for the parameters.
+
+        Returns
+        -------
+        result : SearchResult
+            result of the main search, with the nodes of all workers
+        """
+        options = {"max_depth": max_depth, "time_limit": time_limit, "node_limit": node_limit}
+        if self._pool is None:
+            return Searcher(board, table=self.table, book=book, **options).search()
+        if book is not None:
+            entry = book.choice(board)
+            if entry is not None:
+                return SearchResult(entry.move, 0, [entry.move], 0, 0, 0.0)
+
+        self._stop.clear()
+        data = board.to_bytes()
+        futures = [
+            self._pool.submit(_search, data, worker, options) for worker in range(self.workers)
+        ]
+        try:
+            result = futures[0].result()
+        finally:
+            # helpers only serve the main search
+            self._stop.set()
+            nodes = sum(future.result().nodes for future in futures[1:])
+        return result._replace(nodes=result.nodes + nodes)
+
+
+def parallel_search(
+        board, workers=None, max_depth=None, time_limit=None, node_limit=None, size_mb=64,
+        book=None):
+    """
+    search a single position with lazy SMP, see ``ParallelSearch``
+
+    Returns
+    -------
+    result : SearchResult
+    """
+    with ParallelSearch(workers, size_mb) as pool:
+        return pool.search(board, max_depth, time_limit, node_limit, book)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="search a position on several cores")
+    parser.add_argument("--fen", default=Chess.initial_fen, help="position to search")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="search processes")
+    parser.add_argument("--depth", type=int, default=5, help="search depth")
+    parser.add_argument("--movetime", type=float, help="seconds to search")
+    parser.add_argument("--nodes", type=int, help="node budget of each worker")
+    parser.add_argument("--hash", type=float, default=64, help="shared table size in MB")
+    args = parser.parse_args()
+
+    result = parallel_search(
+        Board(args.fen), args.workers, args.depth, args.movetime, args.nodes, args.hash
+    )
+    print(
+        f"bestmove {None if result.move is None else move2uci(result.move)} "
+        f"score {result.score} depth {result.depth} nodes {result.nodes} "
+        f"time {result.seconds:.2f} pv {' '.join(move2uci(move) for move in result.pv)}"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from bitboard import move2uci
+from board import Board
+from chess import Chess
+
+
+# standard perft positions with known node counts from depth 1
+POSITIONS = [
+    (
+        "initial",
+        Chess.initial_fen,
+        [20, 400, 8902, 197281, 4865609]
+    ),
+    (
+        "kiwipete",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2039, 97862, 4085603]
+    ),
+    (
+        "position3",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        [14, 191, 2812, 43238, 674624]
+    ),
+    (
+        "position4",
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 264, 9467, 422333]
+    ),
+    (
+        "position5",
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [44, 1486, 62379, 2103487]
+    ),
+    (
+        "position6",
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890, 3894594]
+    ),
+]
+
+
+def perft(board, depth):
+    """
+    count leaf nodes of the legal move tree
+
+    Parameters
+    ----------
+    board : Board
+        position to start from, restored when this returns
+    depth : int
+        number of plies to search
+
+    Returns
+    -------
+    nodes : int
+        number of positions reached after exactly ``depth`` plies
+    """
+    if depth == 0:
+        return 1
+    moves = board.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def divide(board, depth):
+    """ perft node counts below each legal move, keyed by long algebraic notation """
+    counts = {}
+    for move in board.legal_moves():
+        undo = board.make_move(move)
+        counts[move2uci(move)] = perft(board, depth - 1)
+        board.unmake_move(undo)
+    return counts
+
+
+def benchmark(depth):
+    """
+    run perft on the standard positions and check the node counts
+
+    Parameters
+    ----------
+    depth : int
+        maximum depth, positions are searched as deep as known counts allow
+
+    Returns
+    -------
+    results : list
+        one dict per position with node counts and timings
+    """
+    results = []
+    for name, fen, expected in POSITIONS:
+        board = Board(fen)
+        position_depth = min(depth, len(expected))
+        start = time.perf_counter()
+        nodes = perft(board, position_depth)
+        seconds = time.perf_counter() - start
+        results.append({
+            "name": name,
+            "fen": fen,
+            "depth": position_depth,
+            "nodes": nodes,
+            "expected": expected[position_depth - 1],
+            "ok": nodes == expected[position_depth - 1],
+            "seconds": seconds,
+            "nps": nodes / seconds if seconds > 0 else 0.0,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="count move generation nodes")
+    parser.add_argument("depth", type=int, nargs="?", default=3, help="search depth")
+    parser.add_argument("--fen", default=Chess.initial_fen, help="position to search")
+    parser.add_argument("--divide", action="store_true", help="show node counts per move")
+    parser.add_argument(
+        "--bench", action="store_true", help="run the standard positions and check node counts"
+    )
+    parser.add_argument("--output", help="JSON file to record benchmark timings to")
+    parser.add_argument("--compare", help="JSON file of a previous benchmark to compare with")
+    args = parser.parse_args()
+
+    if not args.bench:
+        board = Board(args.fen)
+        start = time.perf_counter()
+        if args.divide:
+            counts = divide(board, args.depth)
+            for move, count in sorted(counts.items()):
+                print(f"{move}: {count}")
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(board, args.depth)
+        seconds = time.perf_counter() - start
+        print(f"nodes: {nodes}")
+        print(f"time: {seconds:.3f} s")
+        print(f"nps: {nodes / seconds if seconds > 0 else 0.0:.0f}")
+        return 0
+
+    results = benchmark(args.depth)
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {r["name"]: r for r in json.load(f)["results"]}
+    for result in results:
+        line = (
+            f"{result['name']:<10} depth {result['depth']} "
+            f"nodes {result['nodes']:>9} {'ok' if result['ok'] else 'MISMATCH':<8} "
+            f"{result['seconds']:8.3f} s {result['nps']:>10.0f} nps"
+        )
+        old = previous.get(result["name"])
+        if old is not None and old["depth"] == result["depth"] and old["nps"] > 0:
+            line += f" ({result['nps'] / old['nps']:.2f}x)"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
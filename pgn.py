@@ -0,0 +1,424 @@
+"""
+reading and writing games in Portable Game Notation
+
+``read_games`` parses every game of a PGN file into a tree of
+``GameNode`` with comments, NAGs and variations, and ``write_game``
+turns such a tree back into PGN.
+
+For large archives ``replay_games`` and ``replay_positions`` skip the
+game tree altogether: they stream the file game by game, play the main
+line straight on a single Board with ``san.push_san`` and ignore
+comments and variations.
+"""
+
+import re
+from collections import namedtuple
+from board import Board
+from chess import Chess
+from error import ChessError, InvalidMove
+from san import move2san, push_san
+
+# tags written first and in this order
+SEVEN_TAG_ROSTER = ["Event", "Site", "Date", "Round", "White", "Black", "Result"]
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+# numeric annotation glyphs of the traditional suffixes
+SUFFIX_NAGS = {"!": 1, "?": 2, "!!": 3, "??": 4, "!?": 5, "?!": 6}
+
+_TAG = re.compile(r'^\[\s*([A-Za-z0-9_+#=:-]+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_ESCAPE = re.compile(r'\\(.)')
+_TOKEN = re.compile(r'\{([^}]*)\}?|;([^\n]*)|\$(\d+)|([()])|([^\s{}();$]+)')
+_MOVE_NUMBER = re.compile(r'\d+\.+')
+_SUFFIX = re.compile(r'[!?]+$')
+
+# headers : tags of the game
+# moves : encoded moves of the main line that could be played
+# result : result of the game, from the movetext or the Result tag
+# error : message of the move that could not be played, None if all could
+ReplayedGame = namedtuple("ReplayedGame", ["headers", "moves", "result", "error"])
+
+
+class GameNode(object):
+    """
+    move of a game together with the moves that may follow it
+
+    The first of ``variations`` continues the main line of the node,
+    the others are alternatives to it.
+    """
+
+    def __init__(self, move=None, parent=None):
+        self.move = move
+        self.parent = parent
+        self.variations = []
+        self.comment = ""
+        self.starting_comment = ""
+        self.nags = []
+
+    def add_variation(self, move):
+        """ add a move following this node and return its node """
+        node = GameNode(move, self)
+        self.variations.append(node)
+        return node
+
+    def mainline(self):
+        """ encoded moves of the main line following this node """
+        node = self
+        while node.variations:
+            node = node.variations[0]
+            yield node.move
+
+    def end(self):
+        """ last node of the main line following this node """
+        node = self
+        while node.variations:
+            node = node.variations[0]
+        return node
+
+
+class Game(GameNode):
+    """
+    root of a game tree holding the tags of the game
+
+    Moves that could not be read are recorded in ``errors``, the game
+    tree then ends before them.
+    """
+
+    def __init__(self, headers=None):
+        super().__init__()
+        self.headers = {tag: "?" for tag in SEVEN_TAG_ROSTER}
+        self.headers["Date"] = "????.??.??"
+        self.headers["Result"] = "*"
+        if headers is not None:
+            self.headers.update(headers)
+        self.errors = []
+
+    def board(self):
+        """ Board of the starting position """
+        return Board(self.headers.get("FEN", Chess.initial_fen))
+
+
+def _game_texts(lines):
+    # split a PGN stream into the tag lines and movetext of each game
+    headers = []
+    movetext = []
+    in_comment = False
+    for line in lines:
+        if not in_comment:
+            stripped = line.strip()
+            if stripped.startswith("%"):
+                continue
+            if stripped.startswith("["):
+                if movetext:
+                    yield headers, "".join(movetext)
+                    headers = []
+                    movetext = []
+                headers.append(stripped)
+                continue
+            if not stripped and not movetext:
+                continue
+        movetext.append(line)
+        opened = line.rfind("{")
+        if opened >= 0 or "}" in line:
+            in_comment = opened > line.rfind("}")
+    if headers or "".join(movetext).strip():
+        yield headers, "".join(movetext)
+
+
+def _parse_headers(lines):
+    headers = {}
+    for line in lines:
+        match = _TAG.match(line)
+        if match is not None:
+            headers[match.group(1)] = _ESCAPE.sub(r"\1", match.group(2))
+    return headers
+
+
+def _lines(source):
+    # lines of a path or of an open text file
+    if isinstance(source, str):
+        with open(source, encoding="utf-8-sig", errors="replace") as f:
+            yield from f
+    else:
+        yield from source
+
+
+def _parse_movetext(game, movetext):
+    board = game.board()
+    node = game
+    undos = []
+    # node and number of moves played before each open variation
+    stack = []
+    starting_comments = []
+    for match in _TOKEN.finditer(movetext):
+        comment, line_comment, nag, parenthesis, word = match.groups()
+        if comment is not None or line_comment is not None:
+            text = (comment if comment is not None else line_comment).strip()
+            if node is game and not stack:
+                game.comment = f"{game.comment} {text}".strip()
+            elif starting_comments is not None:
+                starting_comments.append(text)
+            else:
+                node.comment = f"{node.comment} {text}".strip()
+        elif nag is not None:
+            if node is not game:
+                node.nags.append(int(nag))
+        elif parenthesis == "(":
+            if node is game:
+                continue
+            stack.append((node, len(undos)))
+            board.unmake_move(undos.pop())
+            node = node.parent
+            starting_comments = []
+        elif parenthesis == ")":
+            if not stack:
+                continue
+            main, depth = stack.pop()
+            while len(undos) >= depth:
+                board.unmake_move(undos.pop())
+            undos.append(board.make_move(main.move))
+            node = main
+            starting_comments = None
+        elif word is not None:
+            if word in RESULTS:
+                continue
+            number = _MOVE_NUMBER.match(word)
+            if number is not None:
+                word = word[number.end():]
+            if not word or word.isdigit():
+                continue
+            suffix = _SUFFIX.search(word)
+            if suffix is not None:
+                word = word[:suffix.start()]
+            if word:
+                try:
+                    move, undo = push_san(board, word)
+                except InvalidMove as e:
+                    game.errors.append(str(e))
+                    return
+                node = node.add_variation(move)
+                undos.append(undo)
+                if starting_comments:
+                    node.starting_comment = " ".join(starting_comments)
+                starting_comments = None
+            if suffix is not None and node is not game and suffix.group() in SUFFIX_NAGS:
+                node.nags.append(SUFFIX_NAGS[suffix.group()])
+
+
+def read_game(text):
+    """
+    parse a single game in PGN
+
+    Returns
+    -------
+    game : Game
+    """
+    for headers, movetext in _game_texts(text.splitlines(True)):
+        game = Game(_parse_headers(headers))
+        _parse_movetext(game, movetext)
+        return game
+    return None
+
+
+def read_games(source):
+    """
+    parse the games of a PGN file one at a time
+
+    Parameters
+    ----------
+    source : str or file object
+        path of the file or an open text file
+
+    Yields
+    ------
+    game : Game
+    """
+    for headers, movetext in _game_texts(_lines(source)):
+        game = Game(_parse_headers(headers))
+        try:
+            _parse_movetext(game, movetext)
+        except ChessError as e:
+            game.errors.append(str(e))
+        yield game
+
+
+def game_texts(source):
+    """
+    PGN text of each game of a file, without parsing the moves
+
+    Parameters
+    ----------
+    source : str or file object
+        path of the file or an open text file
+
+    Yields
+    ------
+    text : str
+        tags and movetext of a game
+    """
+    for headers, movetext in _game_texts(_lines(source)):
+        yield "\n".join(headers) + "\n\n" + movetext
+
+
+def _write_move(node, board, tokens, number):
+    # tokens of a move, its NAGs and comment, the board is left unchanged
+    if node.starting_comment:
+        tokens.append("{ " + node.starting_comment + " }")
+    if board.playing == "w":
+        tokens.append(f"{board.fullmove_number}.")
+    elif number:
+        tokens.append(f"{board.fullmove_number}...")
+    tokens.append(move2san(board, node.move))
+    tokens.extend(f"${nag}" for nag in node.nags)
+    if node.comment:
+        tokens.append("{ " + node.comment + " }")
+
+
+def _write_line(node, board, tokens, number):
+    # tokens of the main line following a node and of the variations on it
+    undos = []
+    while node.variations:
+        main = node.variations[0]
+        _write_move(main, board, tokens, number)
+        number = bool(main.comment)
+        for variation in node.variations[1:]:
+            tokens.append("(")
+            _write_move(variation, board, tokens, True)
+            undo = board.make_move(variation.move)
+            _write_line(variation, board, tokens, bool(variation.comment))
+            board.unmake_move(undo)
+            tokens.append(")")
+            number = True
+        undos.append(board.make_move(main.move))
+        node = main
+    for undo in reversed(undos):
+        board.unmake_move(undo)
+
+
+def write_game(game, columns=80):
+    """
+    PGN of a game
+
+    Parameters
+    ----------
+    game : Game
+        game to write
+    columns : int, optional
+        maximum length of the movetext lines
+
+    Returns
+    -------
+    pgn : str
+    """
+    tags = SEVEN_TAG_ROSTER + [tag for tag in game.headers if tag not in SEVEN_TAG_ROSTER]
+    lines = []
+    for tag in tags:
+        value = game.headers.get(tag, "?")
+        value = value.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'[{tag} "{value}"]')
+    lines.append("")
+
+    tokens = []
+    if game.comment:
+        tokens.append("{ " + game.comment + " }")
+    _write_line(game, game.board(), tokens, True)
+    tokens.append(game.headers.get("Result", "*"))
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > columns:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def _mainline_words(movetext):
+    # SAN moves of the main line, skipping comments, NAGs and variations
+    depth = 0
+    for match in _TOKEN.finditer(movetext):
+        parenthesis = match.group(4)
+        if parenthesis is not None:
+            depth += 1 if parenthesis == "(" else -1
+            continue
+        word = match.group(5)
+        if word is None or depth > 0:
+            continue
+        if word in RESULTS:
+            yield word
+            continue
+        number = _MOVE_NUMBER.match(word)
+        if number is not None:
+            word = word[number.end():]
+        if word and not word.isdigit():
+            word = word.rstrip("!?")
+            if word:
+                yield word
+
+
+def _replay(source, positions):
+    for headers, movetext in _game_texts(_lines(source)):
+        headers = _parse_headers(headers)
+        result = headers.get("Result", "*")
+        moves = []
+        error = None
+        try:
+            board = Board(headers.get("FEN", Chess.initial_fen))
+        except ChessError as e:
+            yield ReplayedGame(headers, moves, result, str(e)), None
+            continue
+        if positions:
+            yield headers, board
+        for word in _mainline_words(movetext):
+            if word in RESULTS:
+                result = word
+                continue
+            try:
+                move, _ = push_san(board, word)
+            except InvalidMove as e:
+                error = str(e)
+                break
+            moves.append(move)
+            if positions:
+                yield headers, board
+        if not positions:
+            yield ReplayedGame(headers, moves, result, error), None
+
+
+def replay_games(source):
+    """
+    play through the main line of every game of a PGN file
+
+    Parameters
+    ----------
+    source : str or iterable
+        path of the file, an open text file or any iterable of lines
+
+    Yields
+    ------
+    game : ReplayedGame
+        tags, moves and result of each game, with the error that stopped
+        the replay if a move could not be played
+    """
+    for game, _ in _replay(source, False):
+        yield game
+
+
+def replay_positions(source):
+    """
+    positions of the main line of every game of a PGN file
+
+    The same Board is updated in place between positions, so anything
+    needed from it has to be read before the next position is requested.
+    Games stop at the first move that cannot be played.
+
+    Yields
+    ------
+    headers : dict
+        tags of the game
+    board : Board
+        starting position, then the position after each move
+    """
+    for headers, board in _replay(source, True):
+        if board is not None:
+            yield headers, board
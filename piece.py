@@ -1,43 +1,63 @@
-from copy import deepcopy
+from attacks import (
+    KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, queen_attacks, rook_attacks
+)
+from bitboard import (
+    BISHOP, COLOR_INDEX, KING, KNIGHT, PAWN, PIECE_LETTERS, PROMOTION_TYPES, QUEEN, ROOK,
+    SQUARE_INDEX, encode_move, squares2notations
+)
 from error import ColorError, InvalidMove, InvalidPiece
 
 
 def abbr2piece(abbreviation):
-    abbr = abbreviation.lower()
-    color = "w" if abbreviation.isupper() else "b"
-    if abbr == "-":
-        return None
-    elif abbr == "p":
-        return Pawn(color)
-    elif abbr == "n":
-        return Knight(color)
-    elif abbr == "b":
-        return Bishop(color)
-    elif abbr == "r":
-        return Rook(color)
-    elif abbr == "q":
-        return Queen(color)
-    elif abbr == "k":
-        return King(color)
-    else:
-        raise InvalidPiece(f"Unknown piece: {abbreviation}")
+    """
+    piece of an abbreviation, e.g. "P" for a white pawn or "k" for a black
+    king, None for "-"
+
+    Pieces hold no state of their own, so there is a single shared
+    instance of each (see ``PIECES``).
+    """
+    try:
+        return PIECES[abbreviation]
+    except KeyError:
+        if abbreviation == "-":
+            return None
+        raise InvalidPiece(f"Unknown piece: {abbreviation}") from None
 
 
 class Piece(object):
-    """ base class of chess pieces """
+    """
+    base class of chess pieces
+
+    A piece is only a color and a kind; where it stands is known from the
+    board holding it, so the methods depending on it take the board and
+    the square of the piece. Pieces are immutable and compare equal if they
+    are of the same color and kind.
+    """
+
+    __slots__ = ("color", "abbreviation", "index")
+    piece_type = None
 
     def __init__(self, color):
         if color not in ["w", "b"]:
             raise ColorError(f"Unknown color: {color}")
-        self.color = color  # which color white or black
-        self.abbreviation = ""
+        index = 6 * COLOR_INDEX[color] + self.piece_type
+        object.__setattr__(self, "color", color)  # which color white or black
+        object.__setattr__(self, "abbreviation", PIECE_LETTERS[index])
+        # index of the piece as in bitboard.PIECE_LETTERS
+        object.__setattr__(self, "index", index)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Pieces are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Pieces are immutable")
 
     def __repr__(self):
         return self.abbreviation
 
     def __eq__(self, other):
         if isinstance(other, Piece):
-            return self.__dict__ == other.__dict__
+            return self.index == other.index
         elif isinstance(other, str):
             return other == self.abbreviation
         return False
@@ -45,251 +65,183 @@ class Piece(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return self.index
+
+    def __reduce__(self):
+        # unpickle as the shared instance
+        return abbr2piece, (self.abbreviation,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     @property
     def name(self):
         return self.__class__.__name__
 
-    def place_at(self, position, board=None):
-        if board is not None:
-            self.board = board
-        self.board[position] = self
-        self.position = position
-        self.home = position
-
-    def move_to(self, dest):
-        if dest not in self.possible_moves():
+    def place_at(self, position, board):
+        board[position] = self
+
+    def move_to(self, board, position, dest, promotion=None):
+        """
+        move this piece from its square to the destination, updating the
+        whole position
+
+        Parameters
+        ----------
+        board : Board
+            board the piece is on
+        position : str
+            square of the piece
+        dest : str
+            destination square
+        promotion : str, optional
+            piece to promote a pawn to ("q", "r", "b" or "n"), queen by default
+
+        Returns
+        -------
+        undo : board.Undo
+            record to take the move back with ``Board.unmake_move``
+        """
+        moves = self.possible_moves(board, position)
+        if dest not in moves:
             raise InvalidMove(
-                f"{self.position} cannot move to {dest}, "
-                f"possible moves are {self.possible_moves()}"
+                f"{position} cannot move to {dest}, possible moves are {moves}"
             )
-        self.board[dest] = self
-        self.board[self.position] = None
-        self.position = dest
+        return board.make_move(self.encode_move(position, dest, promotion))
 
-    def attacking_squares(self):
-        return self.possible_moves()
+    def encode_move(self, position, dest, promotion=None):
+        return encode_move(SQUARE_INDEX[position], SQUARE_INDEX[dest])
 
-    def possible_moves(self):
+    def attacks(self, board, position):
+        """ bitboard of the squares this piece attacks, including its own pieces """
         raise NotImplementedError
 
+    def attacking_squares(self, board, position):
+        return squares2notations(self.attacks(board, position))
 
-class Pawn(Piece):
+    def possible_moves(self, board, position):
+        own = board.occupancy[COLOR_INDEX[self.color]]
+        return squares2notations(self.attacks(board, position) & ~own)
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.abbreviation = "p" if color == "b" else "P"
 
-    def possible_moves(self):
-        moves = []
-        sign = -1 if self.color == "w" else 1
+class Pawn(Piece):
 
-        # standard move
-        dest = self.board.destination(self.position, (sign, 0))
-        if dest is not None:
-            moves.append(dest)
+    __slots__ = ()
+    piece_type = PAWN
 
-            # moving two squares
-            if self.position == self.home:
-                dest = self.board.destination(self.position, (2 * sign, 0))
-                if dest is not None:
-                    moves.append(dest)
+    def attacks(self, board, position):
+        return PAWN_ATTACKS[COLOR_INDEX[self.color]][SQUARE_INDEX[position]]
 
-        # attacking moves
-        dest_candidates = [
-            self.board.destination(self.position, (sign, d)) for d in [-1, 1]
-        ]
-        for cand in dest_candidates:
-            if cand is None:
-                continue
-            if self.board.isdifferentcolor(self.position, cand):
-                moves.append(cand)
-            if self.board.enpassant_target == cand:
-                moves.append(cand)
+    def possible_moves(self, board, position):
+        square = SQUARE_INDEX[position]
+        white = self.color == "w"
 
-        return moves
+        # standard move and moving two squares
+        pushes = 0
+        step = 8 if white else -8
+        if 0 <= square + step < 64 and not board.occupied >> (square + step) & 1:
+            pushes = 1 << (square + step)
+            start = 1 if white else 6
+            if square >> 3 == start and not board.occupied >> (square + 2 * step) & 1:
+                pushes |= 1 << (square + 2 * step)
 
-    def move_to(self, dest):
-        # next en passant target square
-        if self.position == self.home and dest[1] in ["4", "5"]:
-            enpassant_target = self.home[0] + ("3" if dest[1] == "4" else "6")
+        # attacking moves
+        targets = board.occupancy[1 - COLOR_INDEX[self.color]]
+        if board.ep_square is not None and board.playing == self.color:
+            targets |= 1 << board.ep_square
+        return squares2notations(pushes | self.attacks(board, position) & targets)
+
+    def encode_move(self, position, dest, promotion=None):
+        if dest[1] in ["1", "8"]:
+            if promotion is None:
+                promotion = "q"
+            if promotion.lower() not in PROMOTION_TYPES:
+                raise InvalidPiece(f"Cannot promote to {promotion}")
+            promotion = PROMOTION_TYPES[promotion.lower()]
         else:
-            enpassant_target = "-"
-
-        # move this piece
-        super().move_to(dest)
-
-        # promotion
-        if self.position[1] in ["1", "8"]:
-            queen = Queen(self.color)
-            queen.place_at(self.position, self.board)
-            del self
-
-        # en passant capturing
-        if dest == self.board.enpassant_target:
-            sign = -1 if self.color == "w" else 1
-            enemy_position = self.board.destination(dest, (-sign, 0))
-            self.board[enemy_position] = None
-
-        # update en passant target square
-        self.board.enpassant_target = enpassant_target
+            promotion = 0
+        return encode_move(SQUARE_INDEX[position], SQUARE_INDEX[dest], promotion)
 
 
 class Knight(Piece):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.abbreviation = "n" if color == "b" else "N"
+    __slots__ = ()
+    piece_type = KNIGHT
 
-    def possible_moves(self):
-        directions = [
-            (-2, -1), (-2, 1),  # forward (from white's perspective)
-            (-1, 2), (1, 2),    # right
-            (2, 1), (2, -1),    # backward
-            (1, -2), (-1, -2)   # left
-        ]
-        moves = [self.board.destination(self.position, d) for d in directions]
-        return list(filter(None, moves))
+    def attacks(self, board, position):
+        return KNIGHT_ATTACKS[SQUARE_INDEX[position]]
 
 
 class Bishop(Piece):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.abbreviation = "b" if color == "b" else "B"
-
-    def possible_moves(self):
-        directions = [[1, 1], [1, -1], [-1, 1], [-1, -1]]
-        moves = []
-
-        for dir_ in directions:
-            current = deepcopy(dir_)
-            while True:
-                dest = self.board.destination(self.position, current)
-                if dest is None:
-                    break
-                moves.append(dest)
-                if self.board.isdifferentcolor(self.position, dest):
-                    break
-                current = [x + y for x, y in zip(dir_, current)]
-        return moves
+    __slots__ = ()
+    piece_type = BISHOP
 
+    def attacks(self, board, position):
+        return bishop_attacks(SQUARE_INDEX[position], board.occupied)
 
-class Rook(Piece):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.abbreviation = "r" if color == "b" else "R"
-
-    def possible_moves(self):
-        directions = [[1, 0], [0, 1], [-1, 0], [0, -1]]
-        moves = []
-
-        for dir_ in directions:
-            current = deepcopy(dir_)
-            while True:
-                dest = self.board.destination(self.position, current)
-                if dest is None:
-                    break
-                moves.append(dest)
-                if self.board.isdifferentcolor(self.position, dest):
-                    break
-                current = [x + y for x, y in zip(dir_, current)]
-        return moves
+class Rook(Piece):
 
-    def move_to(self, dest):
-        # erase castiling availability
-        if self.color == "w":
-            home_rank = "1"
-            letters = ["K", "Q"]
-        else:
-            home_rank = "8"
-            letters = ["k", "q"]
-        if self.position == "h" + home_rank:
-            self.board.castling = self.board.castling.replace(letters[0], "")
-        elif self.position == "a" + home_rank:
-            self.board.castling = self.board.castling.replace(letters[1], "")
+    __slots__ = ()
+    piece_type = ROOK
 
-        super().move_to(dest)
+    def attacks(self, board, position):
+        return rook_attacks(SQUARE_INDEX[position], board.occupied)
 
 
 class Queen(Piece):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.abbreviation = "q" if color == "b" else "Q"
+    __slots__ = ()
+    piece_type = QUEEN
 
-    def possible_moves(self):
-        return Bishop.possible_moves(self) + Rook.possible_moves(self)
+    def attacks(self, board, position):
+        return queen_attacks(SQUARE_INDEX[position], board.occupied)
 
 
 class King(Piece):
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.abbreviation = "k" if color == "b" else "K"
-
-    def attacking_squares(self):
-        directions = [
-            [-1, -1], [-1, 0], [-1, 1],
-            [0, -1], [0, 1],
-            [1, -1], [1, 0], [1, 1]
-        ]
-        squares = [self.board.destination(self.position, d) for d in directions]
-        return list(filter(None, squares))
-
-    def possible_moves(self):
-        moves = []
+    __slots__ = ()
+    piece_type = KING
+
+    def attacks(self, board, position):
+        return KING_ATTACKS[SQUARE_INDEX[position]]
+
+    def possible_moves(self, board, position):
+        moves = super().possible_moves(board, position)
+        enemy = "b" if self.color == "w" else "w"
         side = ("K", "Q") if self.color == "w" else ("k", "q")
         rank = "1" if self.color == "w" else "8"
-
-        attacked_squares = self.board.attacked_squares(self.color)
-        if self.position == self.home and self.home not in attacked_squares:
-            if (
-                    side[0] in self.board.castling
-                    and self.board["f" + rank] is None and "f" + rank not in attacked_squares
-                    and self.board["g" + rank] is None and "g" + rank not in attacked_squares
-            ):
-                moves.append("g" + rank)
-            if (
-                    side[1] in self.board.castling
-                    and self.board["d" + rank] is None and "d" + rank not in attacked_squares
-                    and self.board["c" + rank] is None and "c" + rank not in attacked_squares
-                    and self.board["b" + rank] is None and "b" + rank not in attacked_squares
-            ):
-                moves.append("c" + rank)
-
-        moves += self.attacking_squares()
+        rook = "R" if self.color == "w" else "r"
+
+        if position != "e" + rank or board.is_attacked(position, enemy):
+            return moves
+        if (
+                side[0] in board.castling and board["h" + rank] == rook
+                and board["f" + rank] is None and not board.is_attacked("f" + rank, enemy)
+                and board["g" + rank] is None and not board.is_attacked("g" + rank, enemy)
+        ):
+            moves.append("g" + rank)
+        if (
+                side[1] in board.castling and board["a" + rank] == rook
+                and board["d" + rank] is None and not board.is_attacked("d" + rank, enemy)
+                and board["c" + rank] is None and not board.is_attacked("c" + rank, enemy)
+                and board["b" + rank] is None
+        ):
+            moves.append("c" + rank)
         return moves
 
-    def move_to(self, dest):
-        if dest not in self.possible_moves():
-            raise InvalidMove(
-                f"{self.position} cannot move to {dest}, "
-                f"possible moves are {self.possible_moves()}"
-            )
 
-        # castling
-        if self.color == "w":
-            home_rank = "1"
-            table = str.maketrans({"K": "", "Q": ""})
-        else:
-            home_rank = "8"
-            table = str.maketrans({"k": "", "q": ""})
-
-        if self.position == self.home:
-            # if king moved erase castling availability
-            self.board.castling = self.board.castling.translate(table)
-
-            if dest == "g" + home_rank:
-                # king side castling, move rook
-                self.board["h" + home_rank].move_to("f" + home_rank)
-            elif dest == "c" + home_rank:
-                # queen side castling, move rook
-                self.board["a" + home_rank].move_to("d" + home_rank)
-
-        self.board[dest] = self
-        self.board[self.position] = None
-        self.position = dest
+# the shared instance of each piece, by abbreviation
+PIECES = {
+    piece.abbreviation: piece
+    for color in ["w", "b"]
+    for piece in (cls(color) for cls in [Pawn, Knight, Bishop, Rook, Queen, King])
+}
 
 
 def main():
@@ -0,0 +1,193 @@
+"""
+opening books in the Polyglot format
+
+A Polyglot book is a file of 16-byte entries sorted by key, big endian:
+
+    bytes  0-7   Zobrist key of the position (see ``zobrist``)
+    bytes  8-9   move: destination square (bits 0-5), origin square
+                 (bits 6-11) and promotion piece type (bits 12-14)
+    bytes 10-11  weight of the move
+    bytes 12-15  learning data
+
+The file is memory mapped and the entries of a position are found with a
+binary search on the key, so looking up a position reads a few pages of
+the book at most and takes microseconds whatever its size. Castling is
+written as the king taking its own rook, and turned into the king move
+of ``bitboard.encode_move`` when read.
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from collections import namedtuple
+from bitboard import PIECE_INDEX, encode_move, move2uci
+from board import Board
+from chess import Chess
+from error import DatabaseError
+
+ENTRY = struct.Struct(">QHHI")
+_KEY = struct.Struct(">Q")
+
+# castling moves of the king as written in books, king taking the rook
+_CASTLING = {(4, 7): 6, (4, 0): 2, (60, 63): 62, (60, 56): 58}
+
+# key : Zobrist key of the position
+# move : encoded move (bitboard.encode_move)
+# weight : weight of the move, commonly proportional to how good it is
+# learn : learning data, unused by most books
+BookEntry = namedtuple("BookEntry", ["key", "move", "weight", "learn"])
+
+
+def decode_move(board, raw):
+    """
+    encoded move (bitboard.encode_move) of a move of a book entry
+
+    Parameters
+    ----------
+    board : Board
+        position of the entry
+    raw : int
+        move as stored in the book
+    """
+    destination = raw & 63
+    origin = raw >> 6 & 63
+    promotion = raw >> 12 & 7
+    king = board.bitboards[PIECE_INDEX["K" if board.playing == "w" else "k"]]
+    if king >> origin & 1:
+        destination = _CASTLING.get((origin, destination), destination)
+    return encode_move(origin, destination, promotion)
+
+
+class OpeningBook(object):
+    """
+    Polyglot opening book file
+
+    Parameters
+    ----------
+    path : str
+        book file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size % ENTRY.size:
+            self._file.close()
+            raise DatabaseError(f"Not a Polyglot book: {path}")
+        # an empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._count = size // ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _first(self, key):
+        # index of the first entry with a key not less than key
+        low = 0
+        high = self._count
+        data = self._map
+        while low < high:
+            middle = (low + high) // 2
+            if _KEY.unpack_from(data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, board, minimum_weight=1):
+        """
+        book entries of a board, in the order of the book
+
+        Moves that are not legal on the board, which may come from
+        another position sharing the key, are left out.
+
+        Parameters
+        ----------
+        board : Board
+            position to look up
+        minimum_weight : int, optional
+            leave out moves with a lower weight
+
+        Returns
+        -------
+        entries : list of BookEntry
+        """
+        key = board.zobrist_key
+        data = self._map
+        entries = []
+        legal = None
+        for index in range(self._first(key), self._count):
+            entry_key, raw, weight, learn = ENTRY.unpack_from(data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            if weight < minimum_weight:
+                continue
+            if legal is None:
+                legal = set(board.legal_moves())
+            move = decode_move(board, raw)
+            if move in legal:
+                entries.append(BookEntry(key, move, weight, learn))
+        return entries
+
+    def find(self, board, minimum_weight=1):
+        """ entry with the highest weight of a board, None if it is not in the book """
+        entries = self.entries(board, minimum_weight)
+        if not entries:
+            return None
+        return max(entries, key=lambda entry: entry.weight)
+
+    def choice(self, board, rng=None):
+        """
+        entry of a board picked at random in proportion to the weights
+
+        Parameters
+        ----------
+        board : Board
+            position to look up
+        rng : random.Random, optional
+            source of randomness, the ``random`` module by default
+
+        Returns
+        -------
+        entry : BookEntry or None
+            None if the board is not in the book
+        """
+        entries = self.entries(board)
+        if not entries:
+            return None
+        rng = random if rng is None else rng
+        return rng.choices(entries, [entry.weight for entry in entries])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="show the moves of a Polyglot book")
+    parser.add_argument("book", help="Polyglot book file")
+    parser.add_argument("--fen", default=Chess.initial_fen, help="position to look up")
+    args = parser.parse_args()
+
+    board = Board(args.fen)
+    with OpeningBook(args.book) as book:
+        entries = book.entries(board)
+        total = sum(entry.weight for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.weight, reverse=True):
+            print(f"{move2uci(entry.move):<6} {entry.weight:>6} {100 * entry.weight / total:5.1f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
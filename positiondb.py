@@ -0,0 +1,288 @@
+"""
+on-disk position database accessed through mmap
+
+The file is a 64-byte header followed by an open-addressed hash table of
+fixed 32-byte records, indexed by the low bits of the Zobrist key of a
+position with linear probing. Records of the same position are stored
+next to each other, so a lookup usually touches a single page of the
+file and costs at most one page fault, however large the file is.
+Opened read-only, the pages are shared by every process using the
+database.
+
+Each record holds statistics of one move played from a position, or of
+the position itself when the move is 0:
+
+    bytes  0-7   Zobrist key (0 marks an empty slot, key 0 is stored as 1)
+    bytes  8-9   encoded move
+    bytes 12-23  white wins, draws and black wins
+    bytes 24-27  evaluation in centipawns from white, NO_EVAL if unknown
+    bytes 28-31  index + 1 of the first game reaching it, 0 if unknown
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+from bitboard import move2uci
+from board import Board
+from chess import Chess
+from error import DatabaseError
+from pgn import game_texts, replay_games
+
+MAGIC = b"CHESSPDB"
+# version 2 is keyed by the Polyglot random numbers of zobrist
+VERSION = 2
+HEADER = struct.Struct("<8sIIQQ32x")
+RECORD = struct.Struct("<QHxxIIIiI")
+NO_EVAL = -2 ** 31
+# at most this fraction of the slots is used, to keep probe sequences short
+MAX_LOAD = 0.75
+
+_RESULTS = {"1-0": (1, 0, 0), "1/2-1/2": (0, 1, 0), "0-1": (0, 0, 1)}
+
+
+class Entry(namedtuple("Entry", ["key", "move", "white", "draws", "black", "eval", "game"])):
+    """
+    record of a position database
+
+    move is 0 for the record of the position itself, eval is None and
+    game is None when unknown (game is the index of a game otherwise)
+    """
+
+    __slots__ = ()
+
+    @property
+    def games(self):
+        return self.white + self.draws + self.black
+
+
+class PositionDB(object):
+    """
+    position database file
+
+    Parameters
+    ----------
+    path : str
+        database file made with ``create``
+    writable : bool, optional
+        open for adding records, read-only by default
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        self._file = open(path, "r+b" if writable else "rb")
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(), 0,
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            )
+        except (ValueError, struct.error):
+            self._file.close()
+            raise DatabaseError(f"Not a position database: {path}") from None
+        magic, version, record_size, slots, count = HEADER.unpack_from(self._map, 0)
+        error = None
+        if magic != MAGIC or record_size != RECORD.size:
+            error = f"Not a position database: {path}"
+        elif version != VERSION:
+            error = f"Unsupported position database version: {version}"
+        elif len(self._map) < HEADER.size + slots * RECORD.size:
+            error = f"Truncated position database: {path}"
+        if error is not None:
+            self._map.close()
+            self._file.close()
+            raise DatabaseError(error)
+        self.slots = slots
+        self._mask = slots - 1
+        self._count = count
+
+    @classmethod
+    def create(cls, path, capacity):
+        """
+        create an empty database and open it for writing
+
+        Parameters
+        ----------
+        path : str
+            file to create, overwritten if it exists
+        capacity : int
+            number of records the database must be able to hold
+        """
+        slots = 1
+        while slots * MAX_LOAD < capacity:
+            slots *= 2
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, slots, 0))
+            # the table is left sparse until records are written
+            f.truncate(HEADER.size + slots * RECORD.size)
+        return cls(path, writable=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if self._map is not None and not self._map.closed:
+            if self.writable:
+                HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, self.slots, self._count)
+                self._map.flush()
+            self._map.close()
+        self._file.close()
+
+    def _offsets(self, key):
+        # offsets of the probe sequence of a key, ending at an empty slot
+        slot = key & self._mask
+        for _ in range(self.slots):
+            yield HEADER.size + slot * RECORD.size
+            slot = (slot + 1) & self._mask
+
+    def add(self, key, move=0, white=0, draws=0, black=0, eval=None, game=None):
+        """
+        add statistics of a move, or of the position if move is 0
+
+        Statistics of a move already in the database are added up, the
+        evaluation is replaced and the first game is kept.
+        """
+        if not self.writable:
+            raise DatabaseError("Position database is opened read-only")
+        key = key or 1
+        data = self._map
+        for offset in self._offsets(key):
+            stored = RECORD.unpack_from(data, offset)
+            if stored[0] == 0:
+                if self._count + 1 > self.slots * MAX_LOAD:
+                    raise DatabaseError("Position database is full")
+                RECORD.pack_into(
+                    data, offset, key, move, white, draws, black,
+                    NO_EVAL if eval is None else eval, 0 if game is None else game + 1
+                )
+                self._count += 1
+                return
+            if stored[0] == key and stored[1] == move:
+                RECORD.pack_into(
+                    data, offset, key, move, stored[2] + white, stored[3] + draws,
+                    stored[4] + black, stored[5] if eval is None else eval,
+                    stored[6] or (0 if game is None else game + 1)
+                )
+                return
+
+    def lookup(self, key):
+        """
+        records of a position
+
+        Parameters
+        ----------
+        key : int
+            Zobrist key of the position
+
+        Returns
+        -------
+        entries : list of Entry
+        """
+        key = key or 1
+        data = self._map
+        entries = []
+        for offset in self._offsets(key):
+            stored = RECORD.unpack_from(data, offset)
+            if stored[0] == 0:
+                break
+            if stored[0] == key:
+                _, move, white, draws, black, eval, game = stored
+                entries.append(Entry(
+                    key, move, white, draws, black,
+                    None if eval == NO_EVAL else eval, game - 1 if game else None
+                ))
+        return entries
+
+    def moves(self, board):
+        """ records of the moves played from a board, most played first """
+        entries = [entry for entry in self.lookup(board.zobrist_key) if entry.move]
+        legal = set(board.legal_moves())
+        # drop moves of another position sharing the key
+        entries = [entry for entry in entries if entry.move in legal]
+        return sorted(entries, key=lambda entry: entry.games, reverse=True)
+
+    def position(self, board):
+        """ record of a board itself, None if it is not in the database """
+        for entry in self.lookup(board.zobrist_key):
+            if not entry.move:
+                return entry
+        return None
+
+
+def build(db_path, pgn_path, max_ply=30, capacity=None):
+    """
+    create a database of the positions of the first moves of the games of a
+    PGN file, with win, draw and loss counts of every position and of every
+    move played
+
+    Parameters
+    ----------
+    db_path : str
+        database file to create
+    pgn_path : str
+        PGN file to read
+    max_ply : int, optional
+        number of moves of each game to record
+    capacity : int, optional
+        number of records to size the database for, by default two per
+        move of every game up to max_ply
+
+    Returns
+    -------
+    count : int
+        number of games read
+    """
+    if capacity is None:
+        capacity = 2 * max_ply * sum(1 for _ in game_texts(pgn_path))
+    count = 0
+    with PositionDB.create(db_path, max(capacity, 1)) as db:
+        for index, game in enumerate(replay_games(pgn_path)):
+            count += 1
+            white, draws, black = _RESULTS.get(game.result, (0, 0, 0))
+            board = Board(game.headers.get("FEN", Chess.initial_fen))
+            for move in game.moves[:max_ply]:
+                db.add(board.zobrist_key, 0, white, draws, black, game=index)
+                db.add(board.zobrist_key, move, white, draws, black, game=index)
+                board.make_move(move)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="build or query a position database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    parser_build = commands.add_parser("build", help="build a database from a PGN file")
+    parser_build.add_argument("pgn", help="PGN file")
+    parser_build.add_argument("database", help="database file to create")
+    parser_build.add_argument("--max-ply", type=int, default=30, help="moves of each game")
+    parser_build.add_argument("--capacity", type=int, help="number of records to allow")
+    parser_query = commands.add_parser("query", help="show the moves played from a position")
+    parser_query.add_argument("database", help="database file")
+    parser_query.add_argument("--fen", default=Chess.initial_fen, help="position to look up")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build(args.database, args.pgn, args.max_ply, args.capacity)
+        with PositionDB(args.database) as db:
+            print(f"{count} games, {len(db)} records, {os.path.getsize(args.database)} bytes")
+        return 0
+
+    board = Board(args.fen)
+    with PositionDB(args.database) as db:
+        for entry in db.moves(board):
+            print(
+                f"{move2uci(entry.move):<6} {entry.games:>8} games "
+                f"+{entry.white} ={entry.draws} -{entry.black}"
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
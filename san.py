@@ -0,0 +1,195 @@
+"""
+moves in Standard Algebraic Notation
+
+Reading a SAN move only looks at the pieces that can reach the
+destination square, instead of generating all legal moves, and plays
+each candidate to test that it does not leave the king in check.
+"""
+
+import re
+from attacks import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, rook_attacks
+from bitboard import (
+    BISHOP, COLOR_INDEX, FILE_A, KING, KNIGHT, PAWN, PROMOTION_LETTERS,
+    PROMOTION_TYPES, QUEEN, RANK_1, ROOK, SQUARE_INDEX, SQUARES, encode_move,
+    iter_squares, lsb, move_destination, move_origin, move_promotion
+)
+from error import InvalidMove
+
+SAN_LETTERS = "PNBRQK"
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?[-x]?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+_CASTLING = {"O-O": 2, "0-0": 2, "O-O-O": -2, "0-0-0": -2}
+
+
+def move2san(board, move, moves=None):
+    """
+    SAN of a legal move
+
+    Parameters
+    ----------
+    board : Board
+        position before the move
+    move : int
+        encoded move
+    moves : list, optional
+        legal moves of the position, generated if not given
+
+    Returns
+    -------
+    san : str
+        move in SAN with check or checkmate suffix
+    """
+    origin = move_origin(move)
+    dest = move_destination(move)
+    piece = board._board[origin]
+    piece_type = piece.piece_type
+
+    if piece_type == KING and dest - origin in (2, -2):
+        san = "O-O" if dest > origin else "O-O-O"
+    elif piece_type == PAWN:
+        if board._board[dest] is not None or dest == board.ep_square:
+            san = SQUARES[origin][0] + "x" + SQUARES[dest]
+        else:
+            san = SQUARES[dest]
+        if dest < 8 or dest > 55:
+            san += "=" + PROMOTION_LETTERS[move_promotion(move) or QUEEN].upper()
+    else:
+        if moves is None:
+            moves = board.legal_moves()
+        others = [
+            move_origin(m) for m in moves
+            if move_destination(m) == dest and move_origin(m) != origin
+            and board._board[move_origin(m)].abbreviation == piece.abbreviation
+        ]
+        san = SAN_LETTERS[piece_type]
+        if others:
+            if all(other & 7 != origin & 7 for other in others):
+                san += SQUARES[origin][0]
+            elif all(other >> 3 != origin >> 3 for other in others):
+                san += SQUARES[origin][1]
+            else:
+                san += SQUARES[origin]
+        if board._board[dest] is not None:
+            san += "x"
+        san += SQUARES[dest]
+
+    undo = board.make_move(move)
+    try:
+        if board.is_check():
+            san += "+" if board.legal_moves() else "#"
+    finally:
+        board.unmake_move(undo)
+    return san
+
+
+def _candidates(board, us, piece_type, dest, file, capture):
+    # origins of the pieces that may move to the destination
+    pieces = board.bitboards[6 * us + piece_type]
+    if piece_type == PAWN:
+        if capture:
+            return PAWN_ATTACKS[1 - us][dest] & pieces & FILE_A << "abcdefgh".index(file)
+        if board._board[dest] is not None:
+            return 0
+        step = -8 if us == 0 else 8
+        if pieces >> (dest + step) & 1:
+            return 1 << (dest + step)
+        double = dest + 2 * step
+        if (
+                dest >> 3 == (3 if us == 0 else 4) and board._board[dest + step] is None
+                and pieces >> double & 1
+        ):
+            return 1 << double
+        return 0
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[dest] & pieces
+    if piece_type == BISHOP:
+        return bishop_attacks(dest, board.occupied) & pieces
+    if piece_type == ROOK:
+        return rook_attacks(dest, board.occupied) & pieces
+    if piece_type == QUEEN:
+        return (bishop_attacks(dest, board.occupied) | rook_attacks(dest, board.occupied)) & pieces
+    return KING_ATTACKS[dest] & pieces
+
+
+def push_san(board, san):
+    """
+    play a move given in SAN on a board
+
+    Parameters
+    ----------
+    board : Board
+        position to play the move in
+    san : str
+        move in SAN, check, checkmate and annotation suffixes are ignored
+
+    Returns
+    -------
+    move : int
+        encoded move
+    undo : Undo
+        record to take the move back with ``board.unmake_move``
+    """
+    text = san.rstrip("+#!?")
+    us = COLOR_INDEX[board.playing]
+
+    if text in _CASTLING:
+        origin = lsb(board.bitboards[6 * us + KING])
+        move = encode_move(origin, origin + _CASTLING[text])
+        if move not in board.legal_moves():
+            raise InvalidMove(f"Illegal move: {san}")
+        return move, board.make_move(move)
+
+    match = _SAN.match(text)
+    if match is None:
+        raise InvalidMove(f"Invalid SAN: {san}")
+    letter, file, rank, dest_notation, promotion = match.groups()
+    dest = SQUARE_INDEX[dest_notation]
+    if board.occupancy[us] >> dest & 1:
+        raise InvalidMove(f"Illegal move: {san}")
+    piece_type = SAN_LETTERS.index(letter) if letter else PAWN
+
+    if piece_type == PAWN:
+        capture = file is not None and file != dest_notation[0]
+        if capture and board._board[dest] is None and dest != board.ep_square:
+            raise InvalidMove(f"Illegal move: {san}")
+        last_rank = dest >> 3 == (7 if us == 0 else 0)
+        if last_rank != (promotion is not None):
+            raise InvalidMove(f"Illegal move: {san}")
+        promotion = PROMOTION_TYPES[promotion.lower()] if promotion else 0
+        origins = _candidates(board, us, PAWN, dest, file, capture)
+    else:
+        if promotion is not None:
+            raise InvalidMove(f"Illegal move: {san}")
+        promotion = 0
+        origins = _candidates(board, us, piece_type, dest, file, False)
+        if file is not None:
+            origins &= FILE_A << "abcdefgh".index(file)
+        if rank is not None:
+            origins &= RANK_1 << 8 * (int(rank) - 1)
+
+    found = None
+    king = 6 * us + KING
+    for origin in iter_squares(origins):
+        move = encode_move(origin, dest, promotion)
+        undo = board.make_move(move)
+        if board.attacked[1 - us] & board.bitboards[king]:
+            board.unmake_move(undo)
+            continue
+        if found is not None:
+            board.unmake_move(undo)
+            raise InvalidMove(f"Ambiguous move: {san}")
+        found = move, undo
+        if origins & (origins - 1):
+            # more candidates to test, each from the original position
+            board.unmake_move(undo)
+    if found is None:
+        raise InvalidMove(f"Illegal move: {san}")
+    if origins & (origins - 1):
+        found = found[0], board.make_move(found[0])
+    return found
+
+
+def san2move(board, san):
+    """ encoded move of a move given in SAN, the board is left unchanged """
+    move, undo = push_san(board, san)
+    board.unmake_move(undo)
+    return move
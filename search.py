@@ -0,0 +1,326 @@
+"""
+alpha-beta search on top of Board
+
+Negamax alpha-beta with iterative deepening and quiescence search, which
+only generates captures and promotions and skips captures that cannot
+bring the score near alpha (delta pruning). Moves are ordered by
+principal variation move, MVV-LVA for captures and promotions, killer
+moves and the history heuristic. Search stops as soon as the time or
+node budget is used up, and the result of the last completed iteration
+is returned.
+"""
+
+import time
+from collections import namedtuple
+from bitboard import PAWN, move_destination, move_origin, move_promotion
+from evaluation import PIECE_VALUES, evaluate
+from transposition import EXACT, LOWER, UPPER
+
+MATE = 100000
+MAX_PLY = 128
+# captures that cannot lift the score within this margin of alpha are pruned
+DELTA_MARGIN = 200
+
+# move : best move (encoded, None if there is no legal move)
+# score : score in centipawns from the point of view of the side to move,
+#     MATE - n for delivering mate in n plies
+# pv : principal variation starting with the best move
+# depth : depth of the last completed iteration, 0 if none completed and
+#     score is the static evaluation
+# nodes : number of nodes searched
+# seconds : time spent
+SearchResult = namedtuple("SearchResult", ["move", "score", "pv", "depth", "nodes", "seconds"])
+
+
+class _Stopped(Exception):
+    """ raised inside the search when the budget is used up """
+
+
+class Searcher(object):
+    """
+    search for the best move of the side to move
+
+    Parameters
+    ----------
+    board : Board
+        position to search, restored after searching
+    max_depth : int, optional
+        maximum depth of iterative deepening
+    time_limit : float, optional
+        hard limit of the search time in seconds
+    node_limit : int, optional
+        hard limit of the number of nodes
+    stop : object, optional
+        anything with ``is_set()`` such as ``threading.Event``, the search
+        stops once it is set
+    callback : callable, optional
+        called with a SearchResult after each completed iteration
+    table : TranspositionTable, optional
+        table to look up and record searched positions in, it may be
+        shared between searches
+    book : polyglot.OpeningBook, optional
+        positions in the book are not searched, a move of the book is
+        returned at once with score and depth 0
+    """
+
+    stop_check_interval = 1024
+
+    def __init__(
+            self, board, max_depth=None, time_limit=None, node_limit=None,
+            stop=None, callback=None, table=None, book=None):
+        self.board = board
+        self.max_depth = MAX_PLY if max_depth is None else min(max_depth, MAX_PLY)
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.stop = stop
+        self.callback = callback
+        self.table = table
+        self.book = book
+
+    def search(self):
+        board = self.board
+        self.nodes = 0
+        self.start = time.perf_counter()
+        self.deadline = None if self.time_limit is None else self.start + self.time_limit
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self.path = [board.zobrist_key]
+
+        if self.book is not None:
+            entry = self.book.choice(board)
+            if entry is not None:
+                return SearchResult(
+                    entry.move, 0, [entry.move], 0, 0, time.perf_counter() - self.start
+                )
+
+        moves = board.legal_moves()
+        if not moves:
+            score = -MATE if board.is_check() else 0
+            return SearchResult(None, score, [], 0, 0, 0.0)
+
+        # fall back on the best ordered move if not even depth 1 completes
+        moves = self.order(moves, None, 0)
+        result = SearchResult(moves[0], evaluate(board), [moves[0]], 0, 0, 0.0)
+        pv = []
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, pv = self.root(moves, depth, pv)
+            except _Stopped:
+                break
+            result = SearchResult(
+                pv[0], score, pv, depth, self.nodes, time.perf_counter() - self.start
+            )
+            if self.callback is not None:
+                self.callback(result)
+            if abs(score) >= MATE - MAX_PLY:
+                break
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - self.start)
+
+    def count_node(self):
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise _Stopped
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise _Stopped
+        if (
+                self.stop is not None and self.nodes % self.stop_check_interval == 0
+                and self.stop.is_set()
+        ):
+            raise _Stopped
+        self.nodes += 1
+
+    def root(self, moves, depth, pv):
+        board = self.board
+        alpha = -MATE - 1
+        best_pv = None
+        for move in self.order(moves, pv[0] if pv else None, 0):
+            undo = board.make_move(move)
+            self.path.append(board.zobrist_key)
+            try:
+                score, child_pv = self.negamax(depth - 1, -MATE - 1, -alpha, 1, pv[1:])
+            finally:
+                self.path.pop()
+                board.unmake_move(undo)
+            score = -score
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + child_pv
+        if self.table is not None:
+            self.table.store(board.zobrist_key, depth, _to_table(alpha, 0), EXACT, best_pv[0])
+        return alpha, best_pv
+
+    def negamax(self, depth, alpha, beta, ply, pv):
+        board = self.board
+        in_check = board.is_check()
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(alpha, beta, ply), []
+
+        self.count_node()
+        if self.isrepetition():
+            return 0, []
+        best = pv[0] if pv else None
+        table = self.table
+        if table is not None:
+            entry = table.probe(board.zobrist_key)
+            if entry is not None:
+                if best is None:
+                    best = entry.move
+                # positions on the principal variation are searched again
+                # so that it can be followed to the end
+                if entry.depth >= depth and not pv:
+                    score = _from_table(entry.score, ply)
+                    if entry.bound == EXACT:
+                        return score, [] if entry.move is None else [entry.move]
+                    if entry.bound == LOWER and score >= beta:
+                        return beta, []
+                    if entry.bound == UPPER and score <= alpha:
+                        return alpha, []
+
+        moves = board.legal_moves()
+        if not moves:
+            return (-MATE + ply if in_check else 0), []
+
+        best_pv = []
+        for move in self.order(moves, best, ply):
+            undo = board.make_move(move)
+            self.path.append(board.zobrist_key)
+            try:
+                score, child_pv = self.negamax(depth - 1, -beta, -alpha, ply + 1, pv[1:])
+            finally:
+                self.path.pop()
+                board.unmake_move(undo)
+            score = -score
+            if score >= beta:
+                if not self.iscapture(move):
+                    self.remember_cutoff(move, ply, depth)
+                if table is not None:
+                    table.store(board.zobrist_key, depth, _to_table(beta, ply), LOWER, move)
+                return beta, []
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + child_pv
+            pv = []
+        if table is not None:
+            if best_pv:
+                table.store(board.zobrist_key, depth, _to_table(alpha, ply), EXACT, best_pv[0])
+            else:
+                table.store(board.zobrist_key, depth, _to_table(alpha, ply), UPPER)
+        return alpha, best_pv
+
+    def quiescence(self, alpha, beta, ply):
+        board = self.board
+        self.count_node()
+        in_check = board.is_check()
+        if in_check:
+            moves = board.legal_moves()
+            if not moves:
+                return -MATE + ply
+        else:
+            stand_pat = evaluate(board)
+            if ply >= MAX_PLY:
+                return stand_pat
+            if stand_pat >= beta:
+                return beta
+            alpha = max(alpha, stand_pat)
+            moves = board.legal_moves(captures=True)
+
+        for move in self.order(moves, None, ply):
+            if not in_check and not move_promotion(move):
+                # delta pruning, an en passant capture wins a pawn
+                victim = board._board[move_destination(move)]
+                gain = PIECE_VALUES[PAWN if victim is None else victim.piece_type]
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+            undo = board.make_move(move)
+            try:
+                score = -self.quiescence(-beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(undo)
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        return alpha
+
+    def isrepetition(self):
+        # positions since the last irreversible move on the current path
+        key = self.path[-1]
+        clock = self.board.halfmove_clock
+        for previous in self.path[-3:-clock - 2:-2]:
+            if previous == key:
+                return True
+        return False
+
+    def iscapture(self, move):
+        board = self.board
+        dest = move_destination(move)
+        if board._board[dest] is not None:
+            return True
+        return dest == board.ep_square and board._board[move_origin(move)].piece_type == PAWN
+
+    def order(self, moves, best, ply):
+        board = self.board
+        killers = self.killers[ply]
+        history = self.history
+        keys = {}
+        for move in moves:
+            if move == best:
+                keys[move] = 1 << 30
+                continue
+            victim = board._board[move_destination(move)]
+            promotion = move_promotion(move)
+            if victim is not None or promotion:
+                attacker = board._board[move_origin(move)]
+                value = PIECE_VALUES[promotion] if promotion else 0
+                if victim is not None:
+                    value += PIECE_VALUES[victim.piece_type]
+                keys[move] = (1 << 28) + 8 * value - attacker.piece_type
+            elif move == killers[0]:
+                keys[move] = (1 << 27) + 1
+            elif move == killers[1]:
+                keys[move] = 1 << 27
+            else:
+                keys[move] = history[move & 0xFFF]
+        return sorted(moves, key=keys.__getitem__, reverse=True)
+
+    def remember_cutoff(self, move, ply, depth):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & 0xFFF] += depth * depth
+        if self.history[move & 0xFFF] >= 1 << 26:
+            self.history = [value // 2 for value in self.history]
+
+
+def _to_table(score, ply):
+    # mate scores are stored relative to the position rather than the root
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def search(
+        board, max_depth=None, time_limit=None, node_limit=None, stop=None, callback=None,
+        table=None, book=None):
+    """
+    search for the best move, see ``Searcher`` for the parameters
+
+    Returns
+    -------
+    result : SearchResult
+        best move, score and principal variation
+    """
+    return Searcher(
+        board, max_depth, time_limit, node_limit, stop, callback, table, book
+    ).search()
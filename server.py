@@ -0,0 +1,326 @@
+"""
+asyncio game server speaking newline-delimited JSON
+
+Clients connect over TCP or a Unix socket and send one JSON object per
+line; every request gets exactly one response line, in order. A request
+has an "op" and may have an "id", which is copied to its response:
+
+    {"op": "create", "fen": <optional>, "color": "w" or "b"}
+    {"op": "join", "game": <game id>}
+    {"op": "move", "game": <game id>, "token": <token>, "move": "e2e4"}
+    {"op": "move", "game": <game id>, "token": <token>, "san": "Nf3"}
+    {"op": "resign", "game": <game id>, "token": <token>}
+    {"op": "state", "game": <game id>}
+
+create and join return the color and the secret token of the player,
+which later requests of that player must carry. Successful responses have
+"ok": true and the state of the game (fen, turn, moves, legal_moves,
+check and result); failures have "ok": false and an "error" object with a
+"code" and a "message". Errors of ``error`` map to codes through
+``ERROR_CODES``, and any other failure is answered with "internal_error"
+rather than closing the connection.
+
+Each game holds its own Chess and an asyncio lock serializing the
+requests on it. Responses are flushed with ``drain``, so a client that
+does not read its responses stops being read from. Games without a
+request for ``idle_timeout`` seconds are evicted.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import secrets
+import sys
+import time
+import traceback
+from bitboard import PIECE_INDEX, move2uci
+from chess import Chess
+from error import (
+    Check, ChessError, ColorError, InvalidFEN, InvalidMove, InvalidNotation, InvalidPiece,
+    NotYourTurn
+)
+
+ERROR_CODES = {
+    ColorError: "invalid_color",
+    InvalidFEN: "invalid_fen",
+    InvalidMove: "invalid_move",
+    InvalidNotation: "invalid_notation",
+    InvalidPiece: "invalid_piece",
+    NotYourTurn: "not_your_turn",
+}
+# longest request line accepted
+LINE_LIMIT = 1 << 16
+
+
+class RequestError(Exception):
+    """ request that cannot be served, turned into an error response """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class Game(object):
+    """ state of a game hosted by the server """
+
+    def __init__(self, game_id, fen=None):
+        self.id = game_id
+        self.chess = Chess(fen)
+        board = self.chess.board
+        counts = board.piece_counts
+        if counts[PIECE_INDEX["K"]] != 1 or counts[PIECE_INDEX["k"]] != 1:
+            raise InvalidFEN("A game needs exactly one king of each color")
+        if self.chess.incheck("b" if board.playing == "w" else "w"):
+            raise InvalidFEN("The side not to move is in check")
+        # token of the player of each color, None until someone joins
+        self.tokens = {"w": None, "b": None}
+        self.result = self.chess.result()
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+    def color_of(self, token):
+        for color, player in self.tokens.items():
+            if (
+                    player is not None and isinstance(token, str)
+                    and secrets.compare_digest(player, token)
+            ):
+                return color
+        raise RequestError("invalid_token", "Token does not belong to a player of this game")
+
+    def state(self, check=False):
+        board = self.chess.board
+        history = self.chess.history
+        return {
+            "game": self.id,
+            "fen": board.fen,
+            "turn": board.playing,
+            "moves": [move2uci(history[ply]) for ply in range(history.ply)],
+            "legal_moves": [] if self.result != "*" else self.chess.legal_moves(),
+            "check": check,
+            "result": self.result,
+            "players": {color: token is not None for color, token in self.tokens.items()},
+        }
+
+
+class GameServer(object):
+    """
+    host of many concurrent games
+
+    Parameters
+    ----------
+    max_games : int, optional
+        games hosted at once, creating more fails with "server_full"
+    idle_timeout : float, optional
+        seconds without a request after which a game is evicted
+    sweep_interval : float, optional
+        seconds between two looks for idle games
+    """
+
+    def __init__(self, max_games=10000, idle_timeout=600, sweep_interval=30):
+        self.max_games = max_games
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.games = {}
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.moves = 0
+
+    def game(self, request):
+        game_id = request.get("game")
+        if not isinstance(game_id, str):
+            raise RequestError("bad_request", f"Game ids are strings: {game_id!r}")
+        game = self.games.get(game_id)
+        if game is None:
+            raise RequestError("unknown_game", f"No game {game_id!r}")
+        game.last_active = time.monotonic()
+        return game
+
+    def create(self, request):
+        if len(self.games) >= self.max_games:
+            raise RequestError("server_full", f"Already hosting {self.max_games} games")
+        color = request.get("color", "w")
+        if color not in ("w", "b"):
+            raise ColorError(f"Unknown color: {color}")
+        fen = request.get("fen")
+        if fen is not None and not isinstance(fen, str):
+            raise InvalidFEN("FEN must be a string")
+        game = Game(str(next(self._ids)), fen)
+        token = secrets.token_hex(16)
+        game.tokens[color] = token
+        self.games[game.id] = game
+        return {"color": color, "token": token, **game.state()}
+
+    def join(self, game):
+        for color in ("w", "b"):
+            if game.tokens[color] is None:
+                token = secrets.token_hex(16)
+                game.tokens[color] = token
+                return {"color": color, "token": token, **game.state()}
+        raise RequestError("game_full", f"Game {game.id} already has two players")
+
+    def move(self, game, request):
+        if game.result != "*":
+            raise RequestError("game_over", f"Game {game.id} is over: {game.result}")
+        chess = game.chess
+        if game.color_of(request.get("token")) != chess.board.playing:
+            raise NotYourTurn("It's not your turn")
+        check = False
+        try:
+            if "san" in request:
+                chess.move_san(str(request["san"]))
+            else:
+                move = str(request.get("move", ""))
+                if len(move) not in (4, 5):
+                    raise InvalidNotation(f"Moves are given as e.g. e2e4 or e7e8q: {move!r}")
+                chess.move(move[:2], move[2:4], move[4:] or None)
+        except Check:
+            # the move has been played and gives check
+            check = True
+        self.moves += 1
+        game.result = chess.result()
+        return game.state(check)
+
+    def resign(self, game, request):
+        if game.result != "*":
+            raise RequestError("game_over", f"Game {game.id} is over: {game.result}")
+        color = game.color_of(request.get("token"))
+        game.result = "0-1" if color == "w" else "1-0"
+        return game.state()
+
+    async def handle(self, request):
+        """
+        serve a decoded request
+
+        Returns
+        -------
+        response : dict
+        """
+        self.requests += 1
+        response = {"id": request.get("id")} if isinstance(request, dict) else {"id": None}
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("bad_request", "Requests must be JSON objects")
+            op = request.get("op")
+            if op == "create":
+                result = self.create(request)
+            elif op in ("join", "move", "resign", "state"):
+                game = self.game(request)
+                async with game.lock:
+                    if op == "join":
+                        result = self.join(game)
+                    elif op == "move":
+                        result = self.move(game, request)
+                    elif op == "resign":
+                        result = self.resign(game, request)
+                    else:
+                        result = game.state()
+            else:
+                raise RequestError("unknown_op", f"Unknown op: {op!r}")
+        except RequestError as e:
+            return {**response, "ok": False, "error": {"code": e.code, "message": str(e)}}
+        except ChessError as e:
+            code = ERROR_CODES.get(type(e), "chess_error")
+            return {**response, "ok": False, "error": {"code": code, "message": str(e)}}
+        except Exception as e:
+            # a bug must not close the connection of the client
+            traceback.print_exc()
+            error = {"code": "internal_error", "message": f"{type(e).__name__}: {e}"}
+            return {**response, "ok": False, "error": error}
+        return {**response, "ok": True, **result}
+
+    async def serve_client(self, reader, writer):
+        """ answer the requests of a connection until it is closed """
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # line longer than the limit, the stream cannot be resynchronized
+                    error = {
+                        "code": "line_too_long",
+                        "message": f"Lines are limited to {LINE_LIMIT} bytes"
+                    }
+                    response = {"id": None, "ok": False, "error": error}
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {
+                        "id": None, "ok": False,
+                        "error": {"code": "bad_json", "message": "Request is not valid JSON"}
+                    }
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                # wait while the client is not reading its responses
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def evict_idle(self):
+        """
+        remove the games idle for longer than idle_timeout
+
+        Returns
+        -------
+        count : int
+            number of games removed
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [
+            game_id for game_id, game in self.games.items()
+            if game.last_active < deadline and not game.lock.locked()
+        ]
+        for game_id in idle:
+            del self.games[game_id]
+        return len(idle)
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """ accept connections on a TCP port, or a Unix socket if path is given, forever """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.serve_client, path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self.serve_client, host, port, limit=LINE_LIMIT)
+        sweeper = asyncio.ensure_future(self.sweep())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="host chess games over newline-delimited JSON")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--unix", help="Unix socket to listen on instead of TCP")
+    parser.add_argument("--max-games", type=int, default=10000, help="games hosted at once")
+    parser.add_argument(
+        "--idle-timeout", type=float, default=600, help="seconds before an idle game is evicted"
+    )
+    args = parser.parse_args()
+
+    server = GameServer(args.max_games, args.idle_timeout, min(30, args.idle_timeout))
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+fixed-size transposition table keyed by Zobrist key
+
+Entries live in a preallocated ``array("Q")`` of two 64-bit words each,
+the full key xored with the packed data and the packed data, so the table
+never grows past the memory budget given at construction. Entries are
+grouped in buckets of two: the first slot keeps the deepest search of a
+position and the second slot is always replaced.
+
+The table may instead be laid over a buffer such as the one of a
+``multiprocessing.shared_memory.SharedMemory`` and written to by several
+processes at once without locking. Storing the key xored with the data
+makes an entry whose two words come from different writes fail the key
+check, so it is read as a miss rather than as a corrupt entry.
+
+Packed data, from the lowest bit:
+
+    bits  0-15  best move (encoded, 0 if none)
+    bits 16-39  score + SCORE_OFFSET
+    bits 40-47  depth
+    bits 48-49  bound (EXACT, LOWER or UPPER, never 0 in a used slot)
+"""
+
+from array import array
+from collections import namedtuple
+
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+SCORE_OFFSET = 1 << 23
+ENTRY_BYTES = 16
+BUCKET_SIZE = 2
+# 64-bit words zeroed at once by clear
+CLEAR_WORDS = 1 << 16
+
+# move : best move found in the position, None if unknown
+# score : score from the point of view of the side to move
+# depth : remaining depth the score was searched to
+# bound : EXACT, LOWER (score is at least this) or UPPER (at most this)
+TTEntry = namedtuple("TTEntry", ["move", "score", "depth", "bound"])
+
+
+def _pack(move, score, depth, bound):
+    return (
+        (move or 0) | (score + SCORE_OFFSET) << 16
+        | min(max(depth, 0), 255) << 40 | bound << 48
+    )
+
+
+def _unpack(data):
+    move = data & 0xFFFF
+    return TTEntry(
+        move if move else None,
+        (data >> 16 & 0xFFFFFF) - SCORE_OFFSET,
+        data >> 40 & 0xFF,
+        data >> 48 & 0x3,
+    )
+
+
+class TranspositionTable(object):
+    """
+    transposition table with a fixed memory budget
+
+    Parameters
+    ----------
+    size_mb : float
+        memory budget in megabytes, the number of buckets is the largest
+        power of two that fits
+    buffer : writable buffer, optional
+        memory to keep the entries in instead of a new array, such as
+        the ``buf`` of a shared memory block; it is used as is, so it must
+        be zeroed or hold a table, and size_mb is ignored
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        if buffer is None:
+            buckets = int(size_mb * (1 << 20)) // (ENTRY_BYTES * BUCKET_SIZE)
+        else:
+            buckets = len(buffer) // (ENTRY_BYTES * BUCKET_SIZE)
+        if buckets < 1:
+            raise ValueError("size_mb is too small for a single bucket")
+        self.buckets = 1 << (buckets.bit_length() - 1)
+        self._mask = self.buckets - 1
+        # key ^ data and data of each slot, side by side
+        if buffer is None:
+            # repeating a one-item array allocates the table without a copy
+            self._slots = array("Q", [0]) * (ENTRY_BYTES // 8 * BUCKET_SIZE * self.buckets)
+        else:
+            self._slots = memoryview(buffer)[:ENTRY_BYTES * BUCKET_SIZE * self.buckets].cast("Q")
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def size(self):
+        """ number of bytes held by the entries """
+        return self._slots.itemsize * len(self._slots)
+
+    def __len__(self):
+        """ number of slots in use """
+        slots = self._slots
+        return sum(1 for i in range(1, len(slots), 2) if slots[i])
+
+    def clear(self):
+        """ remove all entries and reset the statistics """
+        slots = self._slots
+        # zero in pieces, so that clearing needs no second table
+        zeros = array("Q", [0]) * min(len(slots), CLEAR_WORDS)
+        for start in range(0, len(slots), len(zeros)):
+            count = min(len(zeros), len(slots) - start)
+            slots[start:start + count] = zeros if count == len(zeros) else zeros[:count]
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """
+        look up a position
+
+        Parameters
+        ----------
+        key : int
+            Zobrist key of the position
+
+        Returns
+        -------
+        entry : TTEntry or None
+            stored entry, None if the position is not in the table
+        """
+        slots = self._slots
+        i = (key & self._mask) * 2 * BUCKET_SIZE
+        data = slots[i + 1]
+        if data and slots[i] ^ data == key:
+            self.hits += 1
+            return _unpack(data)
+        data = slots[i + 3]
+        if data and slots[i + 2] ^ data == key:
+            self.hits += 1
+            return _unpack(data)
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, move=None):
+        """
+        record the result of a search
+
+        The depth-preferred slot is overwritten if the new search is at
+        least as deep or the slot holds the same position, otherwise the
+        always-replace slot is.
+        """
+        slots = self._slots
+        i = (key & self._mask) * 2 * BUCKET_SIZE
+        data = _pack(move, score, depth, bound)
+        stored = slots[i + 1]
+        same = slots[i] ^ stored == key
+        if same or not stored or depth >= stored >> 40 & 0xFF:
+            if same and not move:
+                # keep the best move of a shallower search of the position
+                data |= stored & 0xFFFF
+        else:
+            i += 2
+            stored = slots[i + 1]
+            if slots[i] ^ stored == key and not move:
+                data |= stored & 0xFFFF
+        slots[i] = key ^ data
+        slots[i + 1] = data
+        self.stores += 1
+
+    def release(self):
+        """
+        let go of the buffer given at construction, so that its owner can
+        close it; the table cannot be used afterwards
+        """
+        if isinstance(self._slots, memoryview):
+            self._slots.release()
+
+    @property
+    def hit_rate(self):
+        """ fraction of probes that found their position """
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self):
+        """ probe and store counters, for reporting """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": self.hit_rate,
+            "used": len(self),
+            "slots": BUCKET_SIZE * self.buckets,
+            "bytes": self.size,
+        }